@@ -0,0 +1,3 @@
+"""
+Benchmarks of the sender, run from the repository root: python -m benchmarks.<name>
+"""
@@ -0,0 +1,83 @@
+"""
+FileListWidget operations for N items under the offscreen Qt platform
+
+    python -m benchmarks.file_list --items 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def drop_event(paths):
+    from PyQt5 import QtCore, QtGui
+    mime = QtCore.QMimeData()
+    mime.setUrls([QtCore.QUrl.fromLocalFile(path) for path in paths])
+    event = QtGui.QDropEvent(QtCore.QPointF(10, 10), QtCore.Qt.CopyAction, mime,
+                             QtCore.Qt.LeftButton, QtCore.Qt.NoModifier)
+    event.mime = mime  # the event does not own the mime data, it would be freed before the drop
+    return event
+
+
+def wait_for_scans(app, widget):
+    """
+    Lets the scan threads finish and deliver their batches
+    """
+    for scanner in list(widget.scanners):
+        scanner.wait()
+    app.processEvents()
+
+
+def run(items=500):
+    from PyQt5 import QtWidgets
+    from file_list_widget import FileListWidget
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    widget = FileListWidget()
+    paths = [f'/renders/turntable_{i:05d}.mp4' for i in range(items)]
+    result = {'benchmark': 'file_list', 'items': items}
+
+    start = time.perf_counter()
+    for path in paths:
+        widget.create_item(path)
+    app.processEvents()
+    result['create_item'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    widget.get_data()
+    result['get_data'] = time.perf_counter() - start
+
+    widget.clear()
+    wait_for_scans(app, widget)
+    event = drop_event(paths)
+    start = time.perf_counter()
+    widget.dropEvent(event)
+    wait_for_scans(app, widget)
+    result['drop'] = time.perf_counter() - start
+
+    event = drop_event(paths)
+    start = time.perf_counter()
+    widget.dropEvent(event)  # every path is a duplicate now
+    wait_for_scans(app, widget)
+    result['drop_duplicates'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    widget.clear()
+    wait_for_scans(app, widget)
+    result['clear'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=500)
+    args = parser.parse_args()
+    print(json.dumps(run(args.items), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Runs the benchmark suite and writes one JSON document with the results, to compare releases
+
+    python -m benchmarks.run --output bench_output.json
+    python -m benchmarks.run --only startup file_list
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = ('startup', 'file_list', 'transcode', 'upload')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL).stdout.decode().strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(name):
+    if name == 'startup':
+        from benchmarks import startup
+        return startup.run(repeat=5)
+    if name == 'file_list':
+        from benchmarks import file_list
+        return file_list.run(items=500)
+    if name == 'transcode':
+        from benchmarks import transcode
+        return transcode.run(seconds=10, size='1920x1080')
+    if name == 'upload':
+        from benchmarks import upload
+        return upload.run(files=10, mb=20)
+    raise ValueError(f'Unknown benchmark {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--output', help='JSON file for the results, stdout by default')
+    args = parser.parse_args()
+
+    report = {'revision': git_revision(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0], 'platform': platform.platform(), 'results': {}}
+    for name in args.only:
+        try:
+            report['results'][name] = run_benchmark(name)
+        except Exception as message:
+            report['results'][name] = {'benchmark': name, 'error': str(message)}
+            print(f'{name} failed: {message}', file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
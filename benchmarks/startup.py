@@ -0,0 +1,91 @@
+"""
+Cold start benchmark: every run is a fresh interpreter that imports main and shows Messanger
+under the offscreen Qt platform. Fails when the median time to the shown window is over
+--max-seconds or when one of the lazy modules was imported before a transcode or upload.
+
+    python -m benchmarks.startup --repeat 5 --max-seconds 2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be loaded when a video is encoded or sent
+LAZY_MODULES = ('aiohttp', 'imageio_ffmpeg', 'moviepy', 'numpy', 'PIL')
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from PyQt5 import QtWidgets
+app = QtWidgets.QApplication(sys.argv)
+messanger = main.Messanger()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({
+    'import_main': imported - start,
+    'first_paint': shown - imported,
+    'lazy_loaded': sorted(name for name in %r if name in sys.modules),
+}))
+messanger.shutdown()
+''' % (LAZY_MODULES,)
+
+
+def benchmark_env(temp_dir):
+    """
+    Offscreen Qt and a private temp dir, so the settings, caches and the journal of the user are not touched
+    """
+    env = dict(os.environ)
+    env['QT_QPA_PLATFORM'] = 'offscreen'
+    env.setdefault('BOT_TOKEN', 'benchmark')
+    for name in ('TMPDIR', 'TEMP', 'TMP'):
+        env[name] = temp_dir
+    return env
+
+
+def run_once(env):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    total = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.decode(errors='replace'))
+    result = json.loads(process.stdout.decode().strip().splitlines()[-1])
+    result['total'] = total
+    return result
+
+
+def run(repeat):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = benchmark_env(temp_dir)
+        runs = [run_once(env) for _ in range(repeat)]
+    summary = {'benchmark': 'startup', 'repeat': repeat, 'python': sys.version.split()[0]}
+    for key in ('import_main', 'first_paint', 'total'):
+        summary[key] = statistics.median(each[key] for each in runs)
+    summary['lazy_loaded'] = sorted({name for each in runs for name in each['lazy_loaded']})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=None, help='fail when the median total is slower')
+    args = parser.parse_args()
+
+    summary = run(args.repeat)
+    print(json.dumps(summary, indent=2))
+    if summary['lazy_loaded']:
+        sys.exit(f'Loaded at startup: {", ".join(summary["lazy_loaded"])}')
+    if args.max_seconds is not None and summary['total'] > args.max_seconds:
+        sys.exit(f'Startup took {summary["total"]:.2f} s, the limit is {args.max_seconds:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
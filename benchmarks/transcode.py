@@ -0,0 +1,62 @@
+"""
+Probe and encode throughput on synthetic clips generated locally with the bundled ffmpeg
+
+    python -m benchmarks.transcode --seconds 10 --size 1920x1080
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcoder
+
+
+def make_clip(path, seconds, size, bitrate='20M'):
+    """
+    Test pattern with a tone, encoded at a high bitrate so it is over the size budget
+    """
+    process = transcoder.run_ffmpeg(['-y', '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30',
+                                     '-f', 'lavfi', '-i', 'sine=frequency=440',
+                                     '-t', str(seconds), '-c:v', 'libx264', '-preset', 'ultrafast',
+                                     '-b:v', bitrate, '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', path])
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.decode(errors='replace'))
+
+
+def run(seconds=10, size='1920x1080'):
+    mb = 1024 * 1024
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, 'source.mp4')
+        make_clip(source, seconds, size)
+
+        start = time.perf_counter()
+        info = transcoder.probe(source)
+        probe_time = time.perf_counter() - start
+
+        max_size = info.size // 4
+        out_path = os.path.join(temp_dir, 'out.mp4')
+        start = time.perf_counter()
+        transcoder.encode(info, out_path, transcoder.target_bitrate(info, max_size))
+        encode_time = time.perf_counter() - start
+        out_size = os.path.getsize(out_path)
+
+    return {'benchmark': 'transcode', 'size': size, 'seconds': seconds,
+            'source_mb': info.size / mb, 'output_mb': out_size / mb, 'budget_mb': max_size / mb,
+            'probe': probe_time, 'encode': encode_time,
+            'source_mb_per_s': info.size / mb / encode_time, 'realtime_factor': info.duration / encode_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--size', default='1920x1080')
+    args = parser.parse_args()
+    print(json.dumps(run(args.seconds, args.size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Upload throughput of BotApi against the local fake Bot API server, optionally with latency,
+a bandwidth cap and flood limits to see the retries
+
+    python -m benchmarks.upload --files 10 --mb 20
+    python -m benchmarks.upload --latency 0.2 --bandwidth 10 --flood-rate 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_api import BotApi, InputFile
+from fake_bot_api import FakeBotApi, FakeServerThread
+
+CHAT_ID = -100
+
+
+def make_files(folder, count, size):
+    paths = []
+    block = os.urandom(1024 * 1024)
+    for i in range(count):
+        path = os.path.join(folder, f'clip_{i}.mp4')
+        with open(path, 'wb') as f:
+            for _ in range(size // len(block)):
+                f.write(block)
+        paths.append(path)
+    return paths
+
+
+async def upload_all(bot, paths):
+    """
+    The same calls as SendPipeline.upload_files (the storage chat pre-upload) and the album send_groups sends after it
+    """
+    messages = await asyncio.gather(*(bot.send_video(CHAT_ID, InputFile(path)) for path in paths))
+    file_ids = [msg['video']['file_id'] for msg in messages]
+    start = time.perf_counter()
+    await bot.send_media_group(CHAT_ID, file_ids, 'benchmark')
+    album = time.perf_counter() - start
+    await bot.close()
+    return album
+
+
+def run(files=10, mb=20, latency=0.0, bandwidth=None, flood_rate=0.0):
+    """
+    bandwidth is in MB/s
+    """
+    api = FakeBotApi(latency, bandwidth and bandwidth * 1024 * 1024, flood_rate, retry_after=1, seed=0)
+    server = FakeServerThread(api).start()
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = make_files(temp_dir, files, mb * 1024 * 1024)
+            bot = BotApi('benchmark', base_url=server.url)
+            loop = asyncio.new_event_loop()
+            start = time.perf_counter()
+            album = loop.run_until_complete(upload_all(bot, paths))
+            total = time.perf_counter() - start
+            loop.close()
+    finally:
+        server.stop()
+    return {'benchmark': 'upload', 'files': files, 'file_mb': mb, 'latency': latency, 'bandwidth': bandwidth,
+            'flood_rate': flood_rate, 'total': total, 'album_by_file_id': album, 'mb_per_s': files * mb / total,
+            'requests': api.requests, 'flood_responses': api.flood_responses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--mb', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float, default=None, help='MB/s')
+    parser.add_argument('--flood-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.files, args.mb, args.latency, args.bandwidth, args.flood_rate), indent=2))
+
+
+if __name__ == '__main__':
+    main()
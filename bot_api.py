@@ -0,0 +1,282 @@
+"""
+Asyncio Telegram Bot API client with a persistent connection pool.
+aiohttp is imported on the first request, it is not needed to show the window
+"""
+import asyncio
+import contextvars
+import io
+import json
+import os
+import random
+import time
+
+from constants import BOT_API_URL, BOT_API_CONNECTIONS, REQUEST_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, \
+    MEDIA_GROUP_LIMIT, MEDIA_GROUP_SIZE_BUDGET, CHAT_MESSAGE_INTERVAL
+
+
+request_retries = contextvars.ContextVar('request_retries', default=None)  # [count] of the current task
+
+
+def count_retries():
+    """
+    Starts counting the repeated requests of the current asyncio task, returns the [count] holder
+    """
+    counter = [0]
+    request_retries.set(counter)
+    return counter
+
+
+class TelegramError(Exception):
+    def __init__(self, description, error_code=None, parameters=None):
+        super().__init__(f'{error_code}: {description}')
+        self.description = description
+        self.error_code = error_code
+        self.parameters = parameters or {}
+
+    @property
+    def retry_after(self):
+        """
+        Seconds to wait before the request can be repeated, None if it should not be repeated
+        """
+        if self.error_code == 429:
+            return self.parameters.get('retry_after', RETRY_BASE_DELAY)
+        if self.error_code and self.error_code >= 500:
+            return 0
+        return None
+
+
+def backoff(attempt):
+    """
+    Exponential delay with full jitter
+    """
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def split_media_groups(sizes, max_items=MEDIA_GROUP_LIMIT, max_bytes=MEDIA_GROUP_SIZE_BUDGET):
+    """
+    Splits items with the given upload sizes into consecutive groups of indexes
+    that fit into the item limit and the size budget of one message
+    """
+    groups = []
+    group, group_size = [], 0
+    for i, size in enumerate(sizes):
+        if group and (len(group) == max_items or group_size + size > max_bytes):
+            groups.append(group)
+            group, group_size = [], 0
+        group.append(i)
+        group_size += size
+    if group:
+        groups.append(group)
+    return groups
+
+
+class RateLimiter:
+    """
+    Keeps calls with the same key (a chat) at least interval seconds apart
+    """
+    def __init__(self, interval=CHAT_MESSAGE_INTERVAL):
+        self.interval = interval
+        self.next_time = {}
+
+    async def wait(self, key):
+        now = time.monotonic()
+        start = max(now, self.next_time.get(key, now))
+        self.next_time[key] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class InputFile:
+    """
+    Local file to upload, files are streamed from disk and closed after the request.
+    on_read(sent, total) is called from the thread that reads the file.
+    Videos can carry a poster jpeg and their size and duration, so chats show them before processing
+    """
+    def __init__(self, path, content_type='video/mp4', on_read=None, thumb=None, width=None, height=None,
+                 duration=None):
+        self.path = path
+        self.content_type = content_type
+        self.on_read = on_read
+        self.thumb = thumb
+        self.width = width
+        self.height = height
+        self.duration = duration
+
+    def video_params(self):
+        return {'width': self.width or None, 'height': self.height or None, 'duration': self.duration or None}
+
+    def thumb_file(self):
+        return InputFile(self.thumb, 'image/jpeg') if self.thumb else None
+
+    def open(self):
+        if self.on_read is None:
+            return open(self.path, 'rb')
+        return ProgressReader(self.path, self.on_read)
+
+
+class ProgressReader(io.BufferedReader):
+    """
+    File that reports how much of it was read, aiohttp still sees a regular buffered file
+    """
+    def __init__(self, path, on_read):
+        super().__init__(io.FileIO(path, 'rb'))
+        self.on_read = on_read
+        self.total = os.path.getsize(path)
+        self.sent = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.sent += len(chunk)
+        self.on_read(self.sent, self.total)
+        return chunk
+
+
+class BotApi:
+    """
+    Must be used from one event loop, the session is created on the first request
+    """
+    def __init__(self, token, base_url=BOT_API_URL, connections=BOT_API_CONNECTIONS, attempts=REQUEST_ATTEMPTS):
+        self.token = token
+        self.attempts = attempts
+        self.base_url = base_url
+        self.connections = connections
+        self.session = None
+
+    def get_session(self):
+        import aiohttp
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connections, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method, params=None, files=None):
+        """
+        Call a Bot API method, files is a dict of form field name to InputFile.
+        Flood waits are respected, network and server errors are retried with backoff
+        """
+        import aiohttp
+        for attempt in range(self.attempts):
+            last_attempt = attempt == self.attempts - 1
+            try:
+                return await self.request_once(method, params, files)
+            except TelegramError as e:
+                if e.retry_after is None or last_attempt:
+                    raise
+                delay = e.retry_after or backoff(attempt)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+                delay = backoff(attempt)
+            print(f'{method} failed, retry in {delay:.1f} s')
+            counter = request_retries.get()
+            if counter is not None:
+                counter[0] += 1
+            await asyncio.sleep(delay)
+
+    async def request_once(self, method, params=None, files=None):
+        import aiohttp
+        url = f'{self.base_url}/bot{self.token}/{method}'
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        opened = []
+        try:
+            if files:
+                data = aiohttp.FormData()
+                for key, value in params.items():
+                    data.add_field(key, value if isinstance(value, str) else json.dumps(value))
+                for name, input_file in files.items():
+                    f = input_file.open()
+                    opened.append(f)
+                    data.add_field(name, f, filename=os.path.basename(input_file.path),
+                                   content_type=input_file.content_type)
+                kwargs = {'data': data}
+            else:
+                kwargs = {'json': params}
+            async with self.get_session().post(url, **kwargs) as response:
+                text = await response.text()
+                try:
+                    result = json.loads(text)
+                except ValueError:
+                    # An error page of a proxy or gateway, 5xx are repeated like the errors of the Bot API
+                    raise TelegramError(f'{response.reason}: {text[:200]}', response.status)
+        finally:
+            for f in opened:
+                f.close()
+        if not result.get('ok'):
+            raise TelegramError(result.get('description'), result.get('error_code'), result.get('parameters'))
+        return result['result']
+
+    async def send_videos(self, chat_id, videos, caption=None):
+        """
+        One video is sent with sendVideo, 2-10 as a media group. Returns the list of sent messages
+        """
+        if len(videos) == 1:
+            return [await self.send_video(chat_id, videos[0], caption)]
+        return await self.send_media_group(chat_id, videos, caption)
+
+    async def send_video(self, chat_id, video, caption=None, disable_notification=None):
+        """
+        video is a file_id or an InputFile
+        """
+        params = {'chat_id': chat_id, 'caption': caption, 'supports_streaming': True,
+                  'disable_notification': disable_notification}
+        files = None
+        if isinstance(video, InputFile):
+            files = {'video': video}
+            params.update(video.video_params())
+            if video.thumb:
+                files['thumbnail'] = video.thumb_file()
+        else:
+            params['video'] = video
+        return await self.request('sendVideo', params, files)
+
+    async def send_photo(self, chat_id, photo, caption=None):
+        """
+        photo is a file_id or an InputFile
+        """
+        params = {'chat_id': chat_id, 'caption': caption}
+        files = None
+        if isinstance(photo, InputFile):
+            files = {'photo': photo}
+        else:
+            params['photo'] = photo
+        return await self.request('sendPhoto', params, files)
+
+    async def send_photos(self, chat_id, photos, caption=None):
+        """
+        One photo or an album of up to MEDIA_GROUP_LIMIT, returns the list of sent messages
+        """
+        if len(photos) == 1:
+            return [await self.send_photo(chat_id, photos[0], caption)]
+        return await self.send_media_group(chat_id, photos, caption, media_type='photo')
+
+    async def send_media_group(self, chat_id, videos, caption=None, media_type='video'):
+        """
+        Album of videos (or photos) from file_ids or InputFiles, the caption goes to the first one
+        """
+        media = []
+        files = {}
+        for i, video in enumerate(videos):
+            item = {'type': media_type, 'media': video}
+            if media_type == 'video':
+                item['supports_streaming'] = True
+            if isinstance(video, InputFile):
+                files[f'{media_type}{i}'] = video
+                item['media'] = f'attach://{media_type}{i}'
+                if media_type == 'video':
+                    item.update({key: value for key, value in video.video_params().items() if value})
+                if video.thumb:
+                    files[f'thumb{i}'] = video.thumb_file()
+                    item['thumbnail'] = f'attach://thumb{i}'
+            if i == 0 and caption:
+                item['caption'] = caption
+            media.append(item)
+        return await self.request('sendMediaGroup', {'chat_id': chat_id, 'media': media}, files)
+
+    async def delete_message(self, chat_id, message_id):
+        return await self.request('deleteMessage', {'chat_id': chat_id, 'message_id': message_id})
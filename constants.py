@@ -1,3 +1,70 @@
-
 SETTINGS_FILE = 'render_360_settings.ini'
-FILE_LIST_ROW_HEIGHT = 30
\ No newline at end of file
+FILE_LIST_ROW_HEIGHT = 30
+
+MAX_UPLOAD_SIZE = 45 * 1024 * 1024  # Telegram bot upload limit is 50 MB, keep a margin for the container
+AUDIO_BITRATE = 128 * 1000  # bit/s
+MIN_VIDEO_BITRATE = 200 * 1000  # bit/s, below this the picture is unusable
+BITRATE_SAFETY = 0.95  # part of the size budget given to the encoder, the rest is muxing overhead
+
+TRANSCODE_CACHE_DIR = 'render_360_cache'
+FINGERPRINT_BLOCK = 1024 * 1024  # bytes hashed from the head and the tail of a file
+
+FILE_ID_CACHE_FILE = '{}_file_ids.json'  # named after the journal, the window, watcher and service keep their own
+
+BOT_API_URL = 'https://api.telegram.org'
+BOT_API_CONNECTIONS = 8  # simultaneous connections of the pooled Bot API client
+
+REQUEST_ATTEMPTS = 5  # tries of one Bot API request on flood wait and network errors
+RETRY_BASE_DELAY = 1.0  # seconds, doubled on every try
+RETRY_MAX_DELAY = 60.0
+SEND_ATTEMPTS = 3  # tries of a whole message, every try resumes with the already uploaded clips
+
+PROGRESS_INTERVAL = 0.2  # seconds between progress updates sent to the GUI
+
+JOB_JOURNAL_FILE = 'render_360_jobs.sqlite'
+JOB_JOURNAL_KEEP = 7 * 24 * 3600  # seconds finished jobs stay in the journal
+
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mov')  # files picked from dropped folders
+SCAN_BATCH_INTERVAL = 0.1  # seconds between batches of found and probed files sent to the GUI
+PROBE_WORKERS = 4  # parallel ffmpeg probes of a folder scan
+
+MEDIA_GROUP_LIMIT = 10  # Telegram accepts 2-10 items in one media group
+MEDIA_GROUP_SIZE_BUDGET = 200 * 1024 * 1024  # bytes uploaded with one media group request
+CHAT_MESSAGE_INTERVAL = 3.0  # seconds between messages to one group chat, Telegram allows about 20 per minute
+UPLOAD_CONCURRENCY = 4  # simultaneous pre-uploads
+
+# Streams that are sent without re-encoding, only copied into a faststart mp4 when needed
+COMPATIBLE_VIDEO_CODECS = ('h264',)
+COMPATIBLE_PIX_FMTS = ('yuv420p', 'yuvj420p')
+COMPATIBLE_AUDIO_CODECS = ('aac', 'mp3')
+COMPATIBLE_EXTENSIONS = ('.mp4', '.m4v')
+
+TELEGRAM_THUMB_SIZE = 320  # px, the longer side of the poster sent with a video
+ROW_THUMB_SIZE = 96  # px, the longer side of the file list thumbnails
+
+SCRATCH_DIR = 'render_360_scratch'  # per-job working files, removed when the job ends
+SCRATCH_STALE_AGE = 10 * 60  # seconds without writes after which leftovers of a crashed run are removed
+CACHE_MIN_AGE = 60 * 60  # seconds a cache entry is kept regardless of the size cap, queued jobs still need it
+
+WATCH_JOURNAL_FILE = 'render_360_watch_jobs.sqlite'  # the watcher does not resume the jobs of the window
+WATCH_POLL_INTERVAL = 2.0  # seconds between scans of the watched folders
+WATCH_SETTLE_TIME = 10.0  # seconds a file keeps its size and mtime before it is treated as written
+WATCH_PROGRESS_INTERVAL = 10.0  # seconds between progress lines of the watcher
+
+SERVICE_JOURNAL_FILE = 'render_360_service_jobs.sqlite'
+SERVICE_PORT = 8360
+SERVICE_POLL_INTERVAL = 1.0  # seconds between status requests of the window to the send service
+
+SEQUENCE_EXTENSIONS = ('.png', '.jpg', '.jpeg')  # numbered frames that are encoded into a video
+SEQUENCE_MIN_FRAMES = 2  # a single numbered image is not a sequence
+FRAME_COPY_BUFFER = 1024 * 1024  # bytes of a frame file read at once while it is piped into ffmpeg
+
+CONTACT_SHEET_CELL = 320  # longer side of one frame of a contact sheet, frames are decoded at this size
+CONTACT_SHEET_QUALITY = 90  # jpeg quality of contact sheets
+
+METRICS_LOG_FILE = '{}_metrics.jsonl'  # named after the journal, one line per finished stage of a send job
+METRICS_LOG_SIZE = 5 * 1024 * 1024  # bytes of the log before it is rotated
+METRICS_LOG_BACKUPS = 3
+METRICS_PROM_FILE = '{}_metrics.prom'  # Prometheus textfile collector format
+METRICS_WINDOW = 1000  # recent stages of every kind the quantiles are computed from
+STOP_POLL_INTERVAL = 0.5  # seconds between the checks of the pool processes whether the app is closing
@@ -0,0 +1,99 @@
+"""
+Contact sheet of a turntable: evenly spaced frames of a clip tiled into one image, so every angle is seen at once.
+Frames are decoded by ffmpeg at the cell size and read from its stdout one by one, memory does not depend
+on the source resolution. numpy and Pillow are imported only by the pool processes
+"""
+import math
+import subprocess
+import tempfile
+import threading
+
+import frame_sequence
+import transcoder
+from constants import CONTACT_SHEET_CELL, CONTACT_SHEET_QUALITY
+from settings import CONTACT_SHEET_FRAMES
+
+
+def grid(count):
+    """
+    (rows, columns) of a sheet, close to a square
+    """
+    columns = math.ceil(math.sqrt(count))
+    return math.ceil(count / columns), columns
+
+
+def cell_size(info, cell=CONTACT_SHEET_CELL):
+    """
+    Even (width, height) of one frame that fits into cell x cell
+    """
+    if not info.width or not info.height:
+        raise transcoder.TranscodeError(f'Can not read the frame size of {info.path}')
+    scale = min(cell / max(info.width, info.height), 1.0)
+    return max(2, int(info.width * scale) // 2 * 2), max(2, int(info.height * scale) // 2 * 2)
+
+
+def read_frames(info, count, width, height):
+    """
+    Yields up to count evenly spaced frames as (height, width, 3) uint8 arrays, ffmpeg is stopped
+    as soon as the last one is read
+    """
+    import numpy as np
+    output_args = ['-vf', f'scale={width}:{height}', '-an', '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1']
+    if isinstance(info, frame_sequence.SequenceInfo):
+        frames = info.sequence.sample(count)  # only the sampled frame files are read
+    elif info.duration:
+        frames = None
+        output_args[1] = f'fps={count}/{info.duration:.3f},' + output_args[1]
+    else:
+        raise transcoder.TranscodeError(f'Can not read the duration of {info.path}')
+    command = [transcoder.ffmpeg_exe(), '-hide_banner', '-nostdin'] + info.input_args() + output_args
+    frame_bytes = width * height * 3
+    errors = []
+    with tempfile.TemporaryFile() as stderr, transcoder.ffmpeg_process(
+            command, stdin=subprocess.PIPE if frames else subprocess.DEVNULL, stdout=subprocess.PIPE,
+            stderr=stderr) as process:
+        if frames:
+            threading.Thread(target=transcoder.write_frames, args=(process.stdin, frames, errors),
+                             daemon=True).start()
+        read = 0
+        try:
+            while read < count:
+                data = process.stdout.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                read += 1
+                yield np.frombuffer(data, np.uint8).reshape(height, width, 3)
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()  # the rest of the clip is not needed
+            process.wait()
+        if not read:
+            stderr.seek(0)
+            lines = stderr.read().decode('utf-8', errors='replace').strip().splitlines()
+            raise transcoder.TranscodeError(lines[-1] if lines else f'No frames in {info.path}')
+
+
+def tile(frames, count, width, height):
+    """
+    Places the frames row by row into one image, the cells without a frame stay black
+    """
+    import numpy as np
+    rows, columns = grid(count)
+    cells = np.zeros((rows * columns, height, width, 3), np.uint8)
+    for i, frame in enumerate(frames):
+        cells[i] = frame
+    # (rows, columns, h, w, 3) -> (rows, h, columns, w, 3) -> one (rows * h, columns * w, 3) image
+    return cells.reshape(rows, columns, height, width, 3).transpose(0, 2, 1, 3, 4).reshape(
+        rows * height, columns * width, 3)
+
+
+def make(info, out_path, count=CONTACT_SHEET_FRAMES, cell=CONTACT_SHEET_CELL):
+    """
+    Writes the contact sheet of a probed clip or frame sequence to out_path as jpeg
+    """
+    from PIL import Image
+    width, height = cell_size(info, cell)
+    sheet = tile(read_frames(info, count, width, height), count, width, height)
+    Image.fromarray(sheet).save(out_path, 'JPEG', quality=CONTACT_SHEET_QUALITY)
+    return out_path
@@ -0,0 +1,227 @@
+"""
+Local stand-in for the Telegram Bot API, so the send path can be run and measured offline.
+Latency, upload bandwidth and flood limits are configurable. Start it and point the sender to it
+with the FAKE_BOT_API_URL environment variable (see settings.py):
+
+    python fake_bot_api.py --port 8081 --latency 0.2 --bandwidth 5 --flood-rate 0.1
+    set FAKE_BOT_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+
+from aiohttp import web
+
+READ_CHUNK = 64 * 1024
+
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Fake render bot', 'username': 'fake_render_bot'}
+
+
+class FakeBotApi:
+    """
+    Accepts the methods the sender uses and answers with messages shaped like the real ones.
+
+    latency - seconds added to every response
+    bandwidth - upload speed shared by all connections, bytes/s, None - unlimited
+    flood_rate - part of the requests answered with 429 Too Many Requests
+    retry_after - seconds the 429 responses ask to wait
+    """
+    def __init__(self, latency=0.0, bandwidth=None, flood_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.message_ids = itertools.count(1)
+        self.files = {}  # file_id -> file object of the responses
+        self.received_bytes = 0
+        self.requests = 0
+        self.flood_responses = 0
+        self.bandwidth_free_at = 0.0  # time the shared link is free for the next chunk
+        self.app = web.Application(client_max_size=0)
+        self.app.router.add_route('*', '/bot{token}/{method}', self.handle)
+
+    async def handle(self, request):
+        self.requests += 1
+        method = request.match_info['method']
+        handler = getattr(self, f'api_{method}', None)
+        if handler is None:
+            return self.error(404, 'Not Found: method not found')
+        params, uploads = await self.read_request(request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_rate and self.random.random() < self.flood_rate:
+            self.flood_responses += 1
+            return self.error(429, f'Too Many Requests: retry after {self.retry_after}',
+                              {'retry_after': self.retry_after})
+        try:
+            result = handler(params, uploads)
+        except (KeyError, ValueError) as e:
+            return self.error(400, f'Bad Request: {e}')
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def error(code, description, parameters=None):
+        response = {'ok': False, 'error_code': code, 'description': description}
+        if parameters:
+            response['parameters'] = parameters
+        return web.json_response(response, status=code)
+
+    async def throttle(self, size):
+        """
+        Holds the reading of an uploaded chunk to keep all uploads together under the bandwidth
+        """
+        if not self.bandwidth:
+            return
+        now = time.monotonic()
+        start = max(now, self.bandwidth_free_at)
+        self.bandwidth_free_at = start + size / self.bandwidth
+        if self.bandwidth_free_at > now:
+            await asyncio.sleep(self.bandwidth_free_at - now)
+
+    async def read_request(self, request):
+        """
+        Parameters and uploaded files (field name -> file object) of a json, form or multipart request
+        """
+        if request.content_type == 'application/json':
+            return await request.json(), {}
+        if request.content_type != 'multipart/form-data':
+            params = dict(request.query)
+            params.update(await request.post())
+            return params, {}
+        params, uploads = {}, {}
+        reader = await request.multipart()
+        async for part in reader:
+            if part.filename:
+                size = 0
+                while True:
+                    chunk = await part.read_chunk(READ_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    await self.throttle(len(chunk))
+                self.received_bytes += size
+                uploads[part.name] = self.new_file(part.filename, size)
+            else:
+                params[part.name] = await part.text()
+        return params, uploads
+
+    def new_file(self, file_name, size):
+        file_id = f'fake{uuid.uuid4().hex}'
+        video = {'duration': 0, 'width': 0, 'height': 0, 'file_name': file_name, 'mime_type': 'video/mp4',
+                 'file_id': file_id, 'file_unique_id': file_id[4:20], 'file_size': size}
+        self.files[file_id] = video
+        return video
+
+    def message(self, chat_id, **content):
+        msg = {'message_id': next(self.message_ids), 'from': BOT_USER, 'date': int(time.time()),
+               'chat': {'id': int(chat_id), 'type': 'supergroup' if int(chat_id) < 0 else 'private'}}
+        msg.update({key: value for key, value in content.items() if value is not None})
+        return msg
+
+    def video(self, media, uploads):
+        """
+        Video object of an attach://name reference, a file_id or an uploaded field
+        """
+        if isinstance(media, dict):
+            return media
+        if media.startswith('attach://'):
+            return uploads[media[len('attach://'):]]
+        return self.files[media]
+
+    def api_sendVideo(self, params, uploads):
+        video = uploads.get('video') or self.video(params['video'], uploads)
+        return self.message(params['chat_id'], video=video, caption=params.get('caption'))
+
+    def api_sendMediaGroup(self, params, uploads):
+        media = params['media']
+        if isinstance(media, str):
+            media = json.loads(media)
+        if not 2 <= len(media) <= 10:
+            raise ValueError('wrong number of media specified')
+        group_id = str(uuid.uuid4().int)[:18]
+        return [self.message(params['chat_id'], media_group_id=group_id, caption=item.get('caption'),
+                             **self.media_content(item.get('type', 'video'), self.video(item['media'], uploads)))
+                for item in media]
+
+    @staticmethod
+    def media_content(media_type, file):
+        if media_type == 'photo':
+            return {'photo': [dict(file, mime_type='image/jpeg')]}
+        return {'video': file}
+
+    def api_sendPhoto(self, params, uploads):
+        photo = uploads.get('photo') or self.video(params['photo'], uploads)
+        return self.message(params['chat_id'], caption=params.get('caption'), **self.media_content('photo', photo))
+
+    def api_deleteMessage(self, params, uploads):
+        return True
+
+    def api_getFile(self, params, uploads):
+        video = self.files[params['file_id']]
+        return {'file_id': video['file_id'], 'file_unique_id': video['file_unique_id'],
+                'file_size': video['file_size'], 'file_path': f'videos/{video["file_unique_id"]}.mp4'}
+
+    def api_getMe(self, params, uploads):
+        return BOT_USER
+
+
+class FakeServerThread(threading.Thread):
+    """
+    Runs the fake server on its own event loop, url is ready after start() returns
+    """
+    def __init__(self, api=None, host='127.0.0.1', port=0):
+        super().__init__(daemon=True)
+        self.api = api or FakeBotApi()
+        self.host = host
+        self.port = port
+        self.url = None
+        self.ready = threading.Event()
+        self.loop = None
+        self.runner = None
+
+    def start(self):
+        super().start()
+        self.ready.wait()
+        return self
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.runner = web.AppRunner(self.api.app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, self.host, self.port)
+        self.loop.run_until_complete(site.start())
+        port = self.runner.addresses[0][1]
+        self.url = f'http://{self.host}:{port}'
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.runner.cleanup())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--bandwidth', type=float, default=None, help='upload speed of all clients, MB/s')
+    parser.add_argument('--flood-rate', type=float, default=0.0, help='part of the requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='seconds in the 429 responses')
+    args = parser.parse_args()
+    bandwidth = args.bandwidth * 1024 * 1024 if args.bandwidth else None
+    api = FakeBotApi(args.latency, bandwidth, args.flood_rate, args.retry_after)
+    web.run_app(api.app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Persistent map of video keys to Telegram file_ids, so an unchanged video is uploaded only once
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from settings import FILE_ID_CACHE_ITEMS
+
+
+class FileIdCache:
+    """
+    file_ids belong to the bot that uploaded them, the cache is dropped when the token changes.
+    The least recently used entries are removed above max_items
+    """
+    def __init__(self, file_path, token, max_items=FILE_ID_CACHE_ITEMS):
+        self.file_path = file_path
+        self.token_hash = hashlib.sha256(token.encode()).hexdigest()
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.file_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('token') == self.token_hash:
+            self.items.update(data.get('items', {}))
+
+    def save(self):
+        """
+        The cache only saves uploads, a failed write is printed and never fails a send
+        """
+        try:
+            descriptor, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.file_path) or None)
+        except OSError as message:
+            print(message)
+            return
+        try:
+            with open(descriptor, 'w', encoding='utf-8') as f:
+                json.dump({'token': self.token_hash, 'items': self.items}, f)
+            os.replace(temp_path, self.file_path)
+        except OSError as message:
+            print(message)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self.lock:
+            file_id = self.items.get(key)
+            if file_id:
+                self.items.move_to_end(key)
+            return file_id
+
+    def set(self, key, file_id):
+        with self.lock:
+            self.items[key] = file_id
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+            self.save()
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+            self.save()
@@ -1,85 +1,241 @@
+import os
 import sys
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QApplication, QWidget, QListWidget, QListWidgetItem, QPushButton, QLabel, QHBoxLayout, \
-    QVBoxLayout
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtWidgets import QApplication, QWidget, QListView, QPushButton, QStyledItemDelegate, QVBoxLayout, \
+    QAbstractItemView
 
-from constants import FILE_LIST_ROW_HEIGHT
+from constants import FILE_LIST_ROW_HEIGHT, SEQUENCE_EXTENSIONS
+from file_scanner import ScanThread
+from frame_sequence import SequenceInfo
 
+DELETE_BUTTON_WIDTH = 30
+THUMB_WIDTH = 48
+TEXT_COLOR = QColor('#fff')
+HOVER_COLOR = QColor('#40a7e3')
+INFO_COLOR = QColor('#8a8f9c')
+BACKGROUND_COLOR = QColor('#272a33')
+INFO_ROLE = Qt.UserRole + 1
+CSS = ("QListView {padding: 10px 10px 2px 20px;"
+       "border-radius: 5px;"
+       "background-color:  #272a33;}")
 
-class FileItemWidget(QWidget):
-    def __init__(self, text, parent=None):
+
+class FileListModel(QAbstractListModel):
+    """
+    List of file paths with a set index, so checking for duplicates does not walk the rows
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.path_set = set()
+        self.info = {}  # path -> VideoInfo of probed files
+        self.thumbs = {}  # path -> QImage
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.UserRole, Qt.ToolTipRole):
+            return self.paths[index.row()]
+        if role == INFO_ROLE:
+            return self.info.get(self.paths[index.row()])
+        if role == Qt.DecorationRole:
+            return self.thumbs.get(self.paths[index.row()])
+        return None
+
+    def set_info(self, results):
+        """
+        Stores a batch of probe results, the rows are repainted once
+        """
+        for path, info, image in results:
+            if path not in self.path_set:
+                continue
+            if info is not None:
+                self.info[path] = info
+            if image is not None and not image.isNull():
+                self.thumbs[path] = image
+        if self.paths:
+            self.dataChanged.emit(self.index(0), self.index(len(self.paths) - 1), [INFO_ROLE, Qt.DecorationRole])
+
+    def add_paths(self, paths):
+        """
+        Appends the new paths with one insert, returns the number of added rows
+        """
+        new_paths = []
+        for path in paths:
+            if path and path not in self.path_set:
+                self.path_set.add(path)
+                new_paths.append(path)
+        if new_paths:
+            first = len(self.paths)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_paths) - 1)
+            self.paths.extend(new_paths)
+            self.endInsertRows()
+        return len(new_paths)
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        path = self.paths.pop(row)
+        self.path_set.discard(path)
+        self.info.pop(path, None)
+        self.thumbs.pop(path, None)
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.paths = []
+        self.path_set = set()
+        self.info = {}
+        self.thumbs = {}
+        self.endResetModel()
+
+
+class FileItemDelegate(QStyledItemDelegate):
+    """
+    Paints a row as a delete button and the path, a click on the button removes the row
+    """
+    def __init__(self, parent=None):
         super().__init__(parent)
+        self.font = QFont("Segoe UI", 12)
+        self.hover_row = None
+
+    @staticmethod
+    def button_rect(option):
+        return QRect(option.rect.left(), option.rect.top(), DELETE_BUTTON_WIDTH, option.rect.height())
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.fillRect(option.rect, BACKGROUND_COLOR)
+        painter.setFont(self.font)
+        painter.setPen(HOVER_COLOR if index.row() == self.hover_row else TEXT_COLOR)
+        painter.drawText(self.button_rect(option), Qt.AlignCenter, "x")
+        text_rect = option.rect.adjusted(DELETE_BUTTON_WIDTH + 6, 0, 0, 0)
+        image = index.data(Qt.DecorationRole)
+        if image is not None:
+            thumb_size = image.size().scaled(QSize(THUMB_WIDTH, option.rect.height() - 4), Qt.KeepAspectRatio)
+            thumb_rect = QRect(text_rect.left(), text_rect.top() + (text_rect.height() - thumb_size.height()) // 2,
+                               thumb_size.width(), thumb_size.height())
+            painter.drawImage(thumb_rect, image)
+        text_rect.setLeft(text_rect.left() + THUMB_WIDTH + 6)
+        info = index.data(INFO_ROLE)
+        if info is not None:
+            info_text = self.info_text(info)
+            painter.setPen(INFO_COLOR)
+            painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignRight, info_text)
+            text_rect.setRight(text_rect.right() - option.fontMetrics.horizontalAdvance(info_text) - 12)
+        painter.setPen(TEXT_COLOR)
+        text = option.fontMetrics.elidedText(index.data(), Qt.ElideMiddle, text_rect.width())
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, text)
+        painter.restore()
+
+    @staticmethod
+    def info_text(info):
+        minutes, seconds = divmod(int(info.duration), 60)
+        text = f'{minutes}:{seconds:02d}  {info.width}x{info.height}  {info.size / 1024 / 1024:.1f} MB'
+        if isinstance(info, SequenceInfo):
+            sequence = info.sequence
+            missing = sum(last - first + 1 for first, last in sequence.gaps())
+            text = f'frames {sequence.first}-{sequence.last}' + (f', {missing} missing' if missing else '') + \
+                f'  {text}'
+        return text
 
-        layout = QHBoxLayout()
-        layout.setContentsMargins(0, 0, 0, 0)
-        self.delete_button = QPushButton("x")
-        self.delete_button.setFixedSize(30, FILE_LIST_ROW_HEIGHT)
-        self.label = QLabel(text)
-        layout.addWidget(self.delete_button)
-        layout.addWidget(self.label)
-        self.setLayout(layout)
-        css = '''   QPushButton {	
-                        color:#fff;
-                        background-color: #272a33;
-                        font: normal 12pt "Segoe UI";
-                        border: none;
-                        }
-                    QPushButton:hover {
-                        color: #40a7e3;
-                        }
-                    QLabel{color:#fff;
-                        background-color:  #272a33;
-                        font: normal 12pt "Segoe UI";
-                        }
-                    '''
-        self.setStyleSheet(css)
-
-
-class FileListWidget(QListWidget):
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), FILE_LIST_ROW_HEIGHT)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and self.button_rect(option).contains(event.pos()):
+            self.hover_row = None
+            self.parent().remove_row(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class FileListWidget(QListView):
     def __init__(self, ):
         super().__init__()
+        self.file_model = FileListModel(self)
+        self.scanners = []
+        self.setModel(self.file_model)
+        self.setItemDelegate(FileItemDelegate(self))
+        self.setUniformItemSizes(True)
+        self.setMouseTracking(True)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.setAcceptDrops(True)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.update_height()
-        self.setStyleSheet("QListWidget {padding: 10px 10px 2px 20px;"
-                           "border-radius: 5px;"
-                           "background-color:  #272a33;}")
+        self.setStyleSheet(CSS)
 
     def clear(self):
-        super().clear()
+        self.stop_scans()
+        self.file_model.clear()
         self.update_height()
 
     def update_height(self):
-        items_number = len(self.get_data())
+        items_number = self.file_model.rowCount()
         height = max(FILE_LIST_ROW_HEIGHT * 2, FILE_LIST_ROW_HEIGHT * (items_number+1))
         self.setFixedHeight(height)
 
     def create_item(self, text):
-        list_item = QListWidgetItem(self)
-        item_widget = FileItemWidget(text)
-        list_item.setSizeHint(item_widget.sizeHint())
-        self.setItemWidget(list_item, item_widget)
-        list_item.setData(Qt.UserRole, text)
-        item_widget.delete_button.clicked.connect(lambda: self.remove_list_item(list_item))
-        self.update_height()
+        self.add_items([text])
+
+    def add_items(self, paths):
+        """
+        Adds the paths that are not in the list yet, the height is updated once
+        """
+        if self.file_model.add_paths(paths):
+            self.update_height()
+
+    def scan(self, roots):
+        """
+        Adds the videos found in the roots (folders or files) from a background thread and shows their probe info
+        """
+        scanner = ScanThread(roots, self)
+        scanner.found.connect(self.add_items)
+        scanner.probed.connect(self.file_model.set_info)
+        scanner.finished.connect(lambda: self.scanners.remove(scanner))
+        self.scanners.append(scanner)
+        scanner.start()
 
-    def remove_list_item(self, list_item):
-        row = self.row(list_item)
-        self.takeItem(row)
+    def stop_scans(self):
+        """
+        Stops the scan threads and waits for them, Qt aborts if a running QThread is destroyed
+        """
+        for scanner in list(self.scanners):
+            scanner.stop()
+        for scanner in list(self.scanners):
+            scanner.wait()
+
+    def remove_row(self, row):
+        self.file_model.remove_row(row)
         self.update_height()
 
+    def set_hover_row(self, row):
+        delegate = self.itemDelegate()
+        if delegate.hover_row != row:
+            delegate.hover_row = row
+            self.viewport().update()
+
+    def mouseMoveEvent(self, event):
+        index = self.indexAt(event.pos())
+        over_button = index.isValid() and event.pos().x() < self.visualRect(index).left() + DELETE_BUTTON_WIDTH
+        self.set_hover_row(index.row() if over_button else None)
+        super().mouseMoveEvent(event)
+
+    def leaveEvent(self, event):
+        self.set_hover_row(None)
+        super().leaveEvent(event)
+
     def get_data(self):
         """
         Method to get all file paths
         """
-        paths = []
-        for index in range(self.count()):
-            list_item = self.item(index)
-            file_path = list_item.data(Qt.UserRole)
-            paths.append(file_path)
-        return paths
+        return list(self.file_model.paths)
 
     def dragEnterEvent(self, event):
         """
@@ -107,17 +263,14 @@ class FileListWidget(QListWidget):
         if event.mimeData().hasUrls():
             event.setDropAction(Qt.CopyAction)
             event.accept()
-
-            urls = event.mimeData().urls()
-            for url in urls:
-                file_path = url.toLocalFile()
-                try:
-                    if file_path not in self.get_data():
-                        self.create_item(file_path)
-                        self.update_height()
-
-                except Exception as e:
-                    print(e)
+            try:
+                paths = [url.toLocalFile() for url in event.mimeData().urls()]
+                # frames are added by the scan as their sequence
+                self.add_items([path for path in paths
+                                if not os.path.isdir(path) and not path.lower().endswith(SEQUENCE_EXTENSIONS)])
+                self.scan(paths)  # folders are walked and every video is probed in the background
+            except Exception as e:
+                print(e)
         else:
             event.ignore()
 
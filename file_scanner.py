@@ -0,0 +1,141 @@
+"""
+Background scanning of dropped folders and probing of the found videos
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+import frame_sequence
+import transcoder
+from constants import VIDEO_EXTENSIONS, SCAN_BATCH_INTERVAL, PROBE_WORKERS, ROW_THUMB_SIZE, SEQUENCE_EXTENSIONS
+from transcode_cache import TranscodeCache, fingerprint
+
+
+def walk(root, extensions=VIDEO_EXTENSIONS):
+    """
+    Yields the video files and the frame sequences under root in name order, root itself if it is a file.
+    Sequences are yielded as pattern paths after the videos of their folder
+    """
+    if not os.path.isdir(root):
+        if os.path.isfile(root):
+            yield frame_sequence.sequence_of(root) or root
+        return
+    try:
+        with os.scandir(root) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name.lower())
+    except OSError as message:
+        print(message)
+        return
+    frames = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            yield from walk(entry.path, extensions)
+        elif entry.name.lower().endswith(extensions):
+            yield entry.path.replace('\\', '/')  # the same form as paths of dropped files
+        elif entry.name.lower().endswith(SEQUENCE_EXTENSIONS):
+            frames.append((entry.name, None))
+    for sequence in frame_sequence.group_frames(root.replace('\\', '/'), frames):
+        yield sequence.pattern
+
+
+def load_thumb(path, source=None):
+    """
+    Small poster of the video for the file list, extracted once and kept in the transcode cache.
+    source is the file the poster is taken from if it is not path, e.g. the first frame of a sequence.
+    QImage can be loaded outside of the GUI thread
+    """
+    thumb = os.path.join(TranscodeCache().folder, f'{fingerprint(path)}_row.jpg')
+    if not os.path.exists(thumb):
+        transcoder.extract_poster(source or path, thumb, ROW_THUMB_SIZE)
+    return QImage(thumb)
+
+
+def probe_quietly(path):
+    """
+    (VideoInfo, QImage) of the video, None instead of what could not be read
+    """
+    info = image = None
+    try:
+        if frame_sequence.is_sequence(path):
+            info = frame_sequence.probe(path)
+            image = load_thumb(path, info.sequence.frame_path(info.sequence.first))
+        else:
+            info = transcoder.probe(path)
+            image = load_thumb(path)
+    except Exception as message:
+        print(message)
+    return info, image
+
+
+class ScanThread(QThread):
+    """
+    Walks the roots and emits the found paths and the probe results in batches,
+    so a folder with thousands of files does not block the GUI
+    """
+    found = pyqtSignal(list)  # [path, ...]
+    probed = pyqtSignal(list)  # [(path, VideoInfo or None, QImage or None), ...]
+
+    def __init__(self, roots, parent=None):
+        super().__init__(parent)
+        self.roots = roots
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.found_buffer = []
+        self.probed_buffer = []
+        self.last_flush = 0.0
+
+    def stop(self):
+        self.stopped = True
+
+    def on_probed(self, path, future):
+        with self.lock:
+            self.probed_buffer.append((path,) + future.result())
+
+    def flush(self, force=False):
+        if self.stopped:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < SCAN_BATCH_INTERVAL:
+            return
+        self.last_flush = now
+        with self.lock:
+            found, self.found_buffer = self.found_buffer, []
+            probed, self.probed_buffer = self.probed_buffer, []
+        if found:
+            self.found.emit(found)
+        if probed:
+            self.probed.emit(probed)
+
+    def run(self):
+        with ThreadPoolExecutor(PROBE_WORKERS) as pool:
+            futures = []
+            seen = set()  # every dropped frame of a sequence yields the same pattern
+            for root in self.roots:
+                for path in walk(root):
+                    if self.stopped:
+                        break
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    with self.lock:
+                        self.found_buffer.append(path)
+                    future = pool.submit(probe_quietly, path)
+                    future.add_done_callback(lambda f, path=path: self.on_probed(path, f))
+                    futures.append(future)
+                    self.flush()
+            self.flush(force=True)
+            while not self.stopped and not all(future.done() for future in futures):
+                time.sleep(SCAN_BATCH_INTERVAL)
+                self.flush()
+            if self.stopped:
+                for future in futures:
+                    future.cancel()
+        self.flush(force=True)
@@ -0,0 +1,203 @@
+"""
+Numbered frame sequences (chair.0001.png, chair.0002.png, ...) as input of the pipeline. A sequence is
+referenced by a pattern path with # in place of the frame number, e.g. renders/chair.####.png,
+and is encoded by streaming the frame files into ffmpeg one by one
+"""
+import functools
+import hashlib
+import os
+import re
+
+import transcoder
+from constants import SEQUENCE_EXTENSIONS, SEQUENCE_MIN_FRAMES
+from settings import SEQUENCE_FRAME_RATE
+
+FRAME_RE = re.compile(r'^(.*?)(\d+)(\.[^.]+)$')
+PATTERN_RE = re.compile(r'^(.*?)(#+)(\.[^.]+)$')  # the run of # right before the extension is the frame number
+DECODERS = {'.png': 'png', '.jpg': 'mjpeg', '.jpeg': 'mjpeg'}
+
+
+def split_pattern(name):
+    """
+    (prefix, extension) of a sequence pattern file name, None for other names
+    """
+    match = PATTERN_RE.match(name)
+    if not match or not match.group(3).lower().endswith(SEQUENCE_EXTENSIONS):
+        return None
+    return match.group(1), match.group(3).lower()
+
+
+def is_sequence(path):
+    """
+    True for a pattern path, a file with # in its name (e.g. #ardena_chair.mp4) is not one
+    """
+    return split_pattern(os.path.basename(path)) is not None and not os.path.isfile(path)
+
+
+def split_frame(name):
+    """
+    (prefix, frame digits, extension) of an image file name, None if it is not a numbered image
+    """
+    match = FRAME_RE.match(name)
+    if not match or not match.group(3).lower().endswith(SEQUENCE_EXTENSIONS):
+        return None
+    return match.groups()
+
+
+class Sequence:
+    """
+    Frames of one sequence found in a folder: {frame number: (file name, os.stat_result or None)}
+    """
+    def __init__(self, folder, prefix, extension, frames):
+        self.folder = folder
+        self.prefix = prefix
+        self.extension = extension
+        self.frames = frames
+        self.numbers = sorted(frames)
+        padding = min(len(FRAME_RE.match(name).group(2)) for name, _ in frames.values())
+        self.pattern = f'{folder}/{prefix}{"#" * padding}{extension}'
+
+    @property
+    def first(self):
+        return self.numbers[0]
+
+    @property
+    def last(self):
+        return self.numbers[-1]
+
+    @property
+    def size(self):
+        return sum(stat.st_size for _, stat in self.frames.values() if stat)
+
+    def gaps(self):
+        """
+        [(first missing, last missing), ...] frame ranges
+        """
+        return [(previous + 1, number - 1) for previous, number in zip(self.numbers, self.numbers[1:])
+                if number - previous > 1]
+
+    def frame_path(self, number):
+        return f'{self.folder}/{self.frames[number][0]}'
+
+    def sample(self, count):
+        """
+        Files of count evenly spaced existing frames, starting with the first one
+        """
+        step = len(self.numbers) / count
+        numbers = sorted({self.numbers[min(int(i * step), len(self.numbers) - 1)] for i in range(count)})
+        return [self.frame_path(number) for number in numbers]
+
+    def paths(self):
+        """
+        Frame files for every frame from the first to the last, a missing frame repeats the previous one
+        so the turntable keeps its speed
+        """
+        previous = None
+        for number in range(self.first, self.last + 1):
+            if number in self.frames:
+                previous = self.frame_path(number)
+            yield previous
+
+
+def group_frames(folder, entries):
+    """
+    Sequences of the (name, stat) entries of one folder, single numbered images are not sequences
+    """
+    groups = {}
+    for name, stat in entries:
+        parts = split_frame(name)
+        if parts:
+            prefix, digits, extension = parts
+            groups.setdefault((prefix, extension.lower()), {})[int(digits)] = (name, stat)
+    return [Sequence(folder, prefix, extension, frames)
+            for (prefix, extension), frames in sorted(groups.items()) if len(frames) >= SEQUENCE_MIN_FRAMES]
+
+
+def scan_folder(folder, with_stat=True):
+    """
+    One pass over the folder: [(name, os.stat_result or None), ...] of its image files
+    """
+    entries = []
+    with os.scandir(folder) as found:
+        for entry in found:
+            if entry.name.lower().endswith(SEQUENCE_EXTENSIONS):
+                entries.append((entry.name, entry.stat() if with_stat else None))
+    return entries
+
+
+def find(folder, pattern):
+    parts = split_pattern(os.path.basename(pattern))
+    if not parts:
+        return None
+    prefix, extension = parts
+    return next((sequence for sequence in group_frames(folder, scan_folder(folder))
+                 if sequence.prefix == prefix and sequence.extension == extension), None)
+
+
+def load(pattern):
+    """
+    Sequence of a pattern path, TranscodeError if there are no frames
+    """
+    pattern = pattern.replace('\\', '/')
+    sequence = find(os.path.dirname(pattern), pattern)
+    if sequence is None:
+        raise transcoder.TranscodeError(f'No frames of {pattern}')
+    return sequence
+
+
+@functools.lru_cache(maxsize=16)
+def folder_patterns(folder, mtime_ns):
+    """
+    {(prefix, extension): pattern} of the sequences in the folder. Adding or removing a file changes
+    the mtime of the folder, so every frame of a dropped selection does not list the folder again
+    """
+    return {(sequence.prefix, sequence.extension): sequence.pattern
+            for sequence in group_frames(folder, scan_folder(folder, with_stat=False))}
+
+
+def sequence_of(path):
+    """
+    Pattern of the sequence a frame file belongs to, None for other files
+    """
+    folder, name = os.path.split(path.replace('\\', '/'))
+    parts = split_frame(name)
+    if not parts:
+        return None
+    return folder_patterns(folder, os.stat(folder).st_mtime_ns).get((parts[0], parts[2].lower()))
+
+
+def fingerprint(pattern):
+    """
+    Hash of the names, sizes and modification times of the frames, a re-rendered frame changes it
+    """
+    sequence = load(pattern)
+    digest = hashlib.blake2b(sequence.pattern.encode(), digest_size=16)
+    for number in sequence.numbers:
+        name, stat = sequence.frames[number]
+        digest.update(f'{name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()
+
+
+class SequenceInfo(transcoder.VideoInfo):
+    """
+    Probe result of a sequence, the encoder reads the frames from its stdin
+    """
+    def __init__(self, sequence, frame_rate, first_frame):
+        count = sequence.last - sequence.first + 1
+        super().__init__(sequence.pattern, sequence.size, count / frame_rate, video_codec=first_frame.video_codec,
+                         pix_fmt=first_frame.pix_fmt, width=first_frame.width, height=first_frame.height,
+                         format_name='image2pipe')
+        self.sequence = sequence
+        self.frame_rate = frame_rate
+
+    def input_args(self):
+        decoder = DECODERS.get(self.sequence.extension, 'png')
+        return ['-f', 'image2pipe', '-framerate', str(self.frame_rate), '-c:v', decoder, '-i', 'pipe:0']
+
+    def input_frames(self):
+        return self.sequence.paths()
+
+
+def probe(pattern, frame_rate=SEQUENCE_FRAME_RATE):
+    sequence = load(pattern)
+    return SequenceInfo(sequence, frame_rate, transcoder.probe(sequence.frame_path(sequence.first)))
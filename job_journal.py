@@ -0,0 +1,117 @@
+"""
+On-disk journal of send jobs, unfinished jobs are sent again after a restart
+"""
+import json
+import sqlite3
+import threading
+import time
+
+QUEUED = 'queued'
+ENCODING = 'encoding'
+UPLOADING = 'uploading'
+DONE = 'done'
+FAILED = 'failed'
+UNFINISHED = (QUEUED, ENCODING, UPLOADING)
+
+# Everything needed to build the job again
+JOB_FIELDS = ('file_path', 'project', 'message', 'groups', 'sent_groups', 'contact_sheet')
+
+
+class JobJournal:
+    """
+    SQLite table of jobs and their states, safe to use from several threads
+    """
+    def __init__(self, file_path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                'data TEXT NOT NULL, '
+                                'state TEXT NOT NULL, '
+                                'error TEXT, '
+                                'created REAL NOT NULL, '
+                                'updated REAL NOT NULL)')
+        # Paths of every job ever added, remove_finished does not touch them, so the watcher never sends
+        # an old render again. Filled from the jobs when a journal without the table is opened
+        created = not self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'files'").fetchone()
+        self.connection.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY)')
+        if created:
+            rows = self.connection.execute('SELECT data FROM jobs').fetchall()
+            self.add_paths(json.loads(job_data)['file_path'] for job_data, in rows)
+
+    def add(self, data):
+        """
+        Saves a new job and returns its id
+        """
+        now = time.time()
+        job_data = self.dumps(data)
+        with self.lock:
+            cursor = self.connection.execute('INSERT INTO jobs (data, state, created, updated) VALUES (?, ?, ?, ?)',
+                                             (job_data, QUEUED, now, now))
+            self.add_paths([data['file_path']])
+            return cursor.lastrowid
+
+    def add_paths(self, file_paths):
+        self.connection.executemany('INSERT OR IGNORE INTO files (path) VALUES (?)',
+                                    ((path,) for paths in file_paths for path in paths))
+
+    @staticmethod
+    def dumps(data):
+        return json.dumps({field: data.get(field) for field in JOB_FIELDS})
+
+    def update(self, data):
+        """
+        Saves the changed fields of a job, e.g. the chats it was already sent to
+        """
+        with self.lock:
+            self.connection.execute('UPDATE jobs SET data = ?, updated = ? WHERE id = ?',
+                                    (self.dumps(data), time.time(), data['job']))
+
+    def set_state(self, job_id, state, error=None):
+        with self.lock:
+            self.connection.execute('UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?',
+                                    (state, error, time.time(), job_id))
+
+    def unfinished(self):
+        """
+        Jobs that were not sent before the app was closed, the oldest first
+        """
+        placeholders = ', '.join('?' * len(UNFINISHED))
+        with self.lock:
+            rows = self.connection.execute(f'SELECT id, data FROM jobs WHERE state IN ({placeholders}) ORDER BY id',
+                                           UNFINISHED).fetchall()
+        jobs = []
+        for job_id, job_data in rows:
+            data = json.loads(job_data)
+            data['job'] = job_id
+            jobs.append(data)
+        return jobs
+
+    def get(self, job_id):
+        """
+        Fields of the job with its state and error, None if there is no such job
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT data, state, error FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        data.update(job=job_id, state=row[1], error=row[2])
+        return data
+
+    def file_paths(self):
+        """
+        Paths of the files of every job ever added, including the removed ones
+        """
+        with self.lock:
+            rows = self.connection.execute('SELECT path FROM files').fetchall()
+        return {path for path, in rows}
+
+    def remove_finished(self, older_than):
+        """
+        Forget done and failed jobs that were last updated more than older_than seconds ago
+        """
+        with self.lock:
+            self.connection.execute('DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?',
+                                    (DONE, FAILED, time.time() - older_than))
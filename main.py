@@ -1,63 +1,39 @@
 
+import asyncio
 import os
-import queue
 import tempfile
-import types
+import threading
 from pathlib import Path
 from pprint import pprint
 
 from PyQt5 import QtCore, QtWidgets
-import moviepy.editor as editor
-from telepot.namedtuple import InputMediaVideo
 
-from constants import SETTINGS_FILE
+from constants import SETTINGS_FILE, SERVICE_POLL_INTERVAL, SEQUENCE_EXTENSIONS
 from file_list_widget import FileListWidget
-from settings import PROJECT_LIST, RENDER_BOT_ID, ARDENA_BOT_ID, TEST_MODE, BOT_ID
+import job_journal
+from pipeline import SendPipeline, make_message
+from service_client import ServiceClient, ServiceError
+from settings import PROJECT_LIST, SEND_SERVICE_URL
 from window import Ui_MainWindow
 
-import telepot
 from environs import Env
 
 env = Env()
 env.read_env()
-BOT_TOKEN = env('BOT_TOKEN')
+BOT_TOKEN = env('BOT_TOKEN', '') if SEND_SERVICE_URL else env('BOT_TOKEN')  # the service node has the token
 
-if TEST_MODE:
-    ARDENA_BOT_ID = BOT_ID
-    RENDER_BOT_ID = BOT_ID
 
-
-class BaseThread(QtCore.QThread):
-    def __init__(self, queue, parent=None):
-        QtCore.QThread.__init__(self, parent)
-        self.queue = queue
-
-    def run(self):
-        while True:
-            func = self.queue.get()  # Get task
-            if func:
-                func()  # Run input function
-                self.queue.task_done()
-
-
-class ThreadQueue:
+class ProgressSignal(QtCore.QObject):
     """
-    Creates a separate thread with a queue in which functions are dropped
+    Delivers progress from the worker threads to the GUI thread
     """
-    def __init__(self):
-        self.queue = queue.Queue()  # Create a queue
-        self.threads = []
-        self.thread = BaseThread(self.queue)
-        self.threads.append(self.thread)
-        self.thread.start()
-
-    def add_task(self, func):
-        self.queue.put(func)
+    changed = QtCore.pyqtSignal(object, str)
 
 
-class Messanger(ThreadQueue):
+class Messanger(SendPipeline):
     def __init__(self):
-        ThreadQueue.__init__(self)
+        self.progress_signal = ProgressSignal()
+        SendPipeline.__init__(self, BOT_TOKEN, self.progress_signal.changed.emit)
         self.window = QtWidgets.QMainWindow()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self.window)
@@ -68,6 +44,7 @@ class Messanger(ThreadQueue):
         self.ui.path_layout.insertWidget(0, self.ui.file_list_widget)
 
         self.ui.progressBar.hide()
+        self.progress_signal.changed.connect(self.show_progress)
 
         self.ui.messaje_button.clicked.connect(self.run_thread)
         self.ui.project_combo_box.addItems(PROJECT_LIST)
@@ -77,13 +54,23 @@ class Messanger(ThreadQueue):
 
         file_path = os.path.join(tempfile.gettempdir(), SETTINGS_FILE)
         self.settings = QtCore.QSettings(file_path, QtCore.QSettings.IniFormat)
+        self.service = ServiceClient(SEND_SERVICE_URL) if SEND_SERVICE_URL else None
+        self.remote_jobs = []  # jobs submitted to the service that are not finished yet
+        self.remote_lock = threading.Lock()
+        self.tracking = False
 
         self.window.show()
         self.load_settings()
+        self.sweep_temp_files()
+        if not self.service:
+            self.resume_jobs()
+
+    def shutdown(self):
+        self.ui.file_list_widget.stop_scans()
+        SendPipeline.shutdown(self)
 
     def get_data(self):
         text = self.ui.message_text_edit.toPlainText()
-        text = text + "\n" if text else ""
         asset = self.ui.name_line_edit.text()
         data = {'file_path': self.ui.file_list_widget.get_data()}
 
@@ -92,8 +79,8 @@ class Messanger(ThreadQueue):
             self.ui.name_line_edit.setPlaceholderText('Enter the asset name here')
             return
         data['project'] = self.ui.project_combo_box.currentText()
-        wareframe = '#wareframe' if self.ui.wareframe_check_box.isChecked() else ""
-        data['message'] = f'{text}{data["project"]} #{asset} {wareframe}'
+        data['message'] = make_message(data['project'], asset, text, self.ui.wareframe_check_box.isChecked())
+        data['contact_sheet'] = self.ui.contact_sheet_check_box.isChecked()
         return data
 
     def run_thread(self):
@@ -102,33 +89,63 @@ class Messanger(ThreadQueue):
             data = self.get_data()
             if not data:
                 return
-            self.add_task(lambda: self.send_message(data))
+            if self.service:
+                self.submit_remote(data)
+            else:
+                self.submit(data)
             self.clear_fields()
         except Exception as e:
             print(e)
 
-    def send_message(self, data):
-        try:
-            video_file_path = data['file_path']
-            bot = telepot.Bot(BOT_TOKEN)
-            media_group = list()
-            for i, each in enumerate(video_file_path):
-                if self.is_file_large(each):
-                    light_video = self.size_recalculation(each, i)
-                else:
-                    light_video = each
-                if i == 0:
-                    video = InputMediaVideo(media=open(light_video, 'rb'), caption=data['message'])
-                else:
-                    video = InputMediaVideo(media=open(light_video, 'rb'))
-                media_group.append(video)
-
-            bot.sendMediaGroup(RENDER_BOT_ID, media=media_group)
-            if data['project'] == PROJECT_LIST[0]:
-                bot.sendMediaGroup(ARDENA_BOT_ID, media=media_group)
+    def submit_remote(self, data):
+        """
+        Queues the job to be sent to the service, one task of the I/O thread submits and tracks all of them
+        """
+        with self.remote_lock:
+            self.remote_jobs.append(data)
+            start, self.tracking = not self.tracking, True
+        if start:
+            self.add_task(lambda: asyncio.get_event_loop().run_until_complete(self.track_remote_jobs()))
 
-        except Exception as message:
-            print(message)
+    async def track_remote_jobs(self):
+        while True:
+            with self.remote_lock:
+                jobs = list(self.remote_jobs)
+                if not jobs:
+                    self.tracking = False
+                    self.progress_signal.changed.emit(None, '')
+                    return
+            for data in jobs:
+                try:
+                    if 'job' in data:
+                        status = await self.service.status(data['job'])
+                    else:
+                        status = await self.service.submit(data)
+                        data['job'] = status['job']
+                except ServiceError as message:
+                    action = 'Tracking' if 'job' in data else 'Sending'
+                    status = {'state': job_journal.FAILED, 'error': f'{action} {data["message"]!r} failed: {message}'}
+                data['status'] = status
+                if status['state'] in (job_journal.DONE, job_journal.FAILED):
+                    if status.get('error'):
+                        print(status['error'])
+                    with self.remote_lock:
+                        self.remote_jobs.remove(data)
+            with self.remote_lock:
+                active = [data for data in self.remote_jobs if 'status' in data]
+                if active:
+                    status = active[0]['status']
+                    self.progress_signal.changed.emit(status['percent'], f'Service, {len(self.remote_jobs)} '
+                                                                         f'messages: {status["text"]}')
+            await asyncio.sleep(SERVICE_POLL_INTERVAL)
+
+    def show_progress(self, percent, text):
+        if percent is None:
+            self.ui.progressBar.hide()
+            return
+        self.ui.progressBar.setValue(percent)
+        self.ui.progressBar.setFormat(f'{text}  %p%')
+        self.ui.progressBar.show()
 
     def add_path(self):
         if self.settings.contains('video_folder'):
@@ -136,11 +153,14 @@ class Messanger(ThreadQueue):
         else:
             saved_dir = QtCore.QDir.currentPath()
         file_path, _ = QtWidgets.QFileDialog.getOpenFileName(self.window, "Select file", saved_dir,
-                                                             "MP4 Video Files (*.mp4)", None,
+                                                             "Video Files (*.mp4 *.m4v *.mov);;"
+                                                             "Frame sequences (*.png *.jpg *.jpeg)", None,
                                                              QtWidgets.QFileDialog.DontConfirmOverwrite)
         if not file_path:
             return
-        self.ui.file_list_widget.create_item(file_path)
+        if not file_path.lower().endswith(SEQUENCE_EXTENSIONS):
+            self.ui.file_list_widget.create_item(file_path)
+        self.ui.file_list_widget.scan([file_path])  # a frame is added as its sequence
         self.settings.setValue('video_folder', file_path)
 
     def clear_fields(self):
@@ -149,19 +169,6 @@ class Messanger(ThreadQueue):
         self.ui.message_text_edit.clear()
         self.ui.name_line_edit.setPlaceholderText('')
 
-    @staticmethod
-    def is_file_large(file_path, max_size=10):
-        file_size = os.path.getsize(file_path)
-        size_in_bytes = 45 * 1024 * 1024  # 45 МБ в байтах
-        return file_size > max_size
-
-    @staticmethod
-    def size_recalculation(file_path, name_sfx):
-        new_name = os.path.join(tempfile.gettempdir(), f'temp_video_{name_sfx}.mp4')
-        clip = editor.VideoFileClip(file_path)
-        clip.write_videofile(new_name)
-        return new_name
-
     def load_settings(self):
         """
         Load settings
@@ -177,7 +184,10 @@ class Messanger(ThreadQueue):
 
 
 if __name__ == "__main__":
+    import multiprocessing
     import sys
+    multiprocessing.freeze_support()  # pool workers of the one-file exe start through this entry point
     app = QtWidgets.QApplication(sys.argv)
     window = Messanger()  # Создаем экземпляр класса
+    app.aboutToQuit.connect(window.shutdown)
     sys.exit(app.exec_())  # Запускаем цикл обработки событий
@@ -8,7 +8,7 @@ a = Analysis(['main.py'],
              pathex=[],
              binaries=[],
              datas=[],
-             hiddenimports=['magic_filter', 'moviepy', 'imageio_ffmpeg.binaries'],
+             hiddenimports=['magic_filter', 'imageio_ffmpeg.binaries'],
              hookspath=[],
              hooksconfig={},
              runtime_hooks=[],
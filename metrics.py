@@ -0,0 +1,117 @@
+"""
+Per-stage timings of send jobs. Every finished stage (probe, encode, upload of a clip, send to a chat)
+is a line in a rotating JSON-lines log, and a Prometheus textfile with latency quantiles and throughput
+of the recent stages is rewritten after every job
+"""
+import contextlib
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from logging.handlers import RotatingFileHandler
+
+from constants import METRICS_LOG_FILE, METRICS_LOG_SIZE, METRICS_LOG_BACKUPS, METRICS_PROM_FILE, METRICS_WINDOW
+from settings import METRICS_DIR
+
+QUANTILES = (0.5, 0.95)
+
+
+def quantile(values, q):
+    """
+    Nearest-rank quantile of sorted values
+    """
+    return values[max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))]
+
+
+class Metrics:
+    """
+    Safe to use from the worker threads and the pool callbacks
+    """
+    def __init__(self, name, folder=METRICS_DIR, window=METRICS_WINDOW):
+        """
+        name tells the files and the series of the processes apart, e.g. the window from the watcher
+        """
+        folder = folder or tempfile.gettempdir()
+        self.name = name
+        self.prom_path = os.path.join(folder, METRICS_PROM_FILE.format(name))
+        self.handler = RotatingFileHandler(os.path.join(folder, METRICS_LOG_FILE.format(name)),
+                                           maxBytes=METRICS_LOG_SIZE, backupCount=METRICS_LOG_BACKUPS,
+                                           encoding='utf-8', delay=True)
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: deque(maxlen=window))  # stage: (seconds, bytes, retries, ok)
+
+    def record(self, job, stage, seconds, bytes=0, retries=0, ok=True, error=None, **fields):
+        """
+        Adds one finished stage, fields are e.g. the clip index or the chat
+        """
+        line = dict(time=round(time.time(), 3), job=job, stage=stage, seconds=round(seconds, 4), bytes=bytes,
+                    retries=retries, ok=ok, **fields)
+        if error:
+            line['error'] = error
+        with self.lock:
+            self.samples[stage].append((seconds, bytes, retries, ok))
+        try:
+            self.handler.handle(logging.makeLogRecord({'msg': json.dumps(line)}))
+        except Exception as message:
+            print(message)
+
+    @contextlib.contextmanager
+    def stage(self, job, stage, **fields):
+        """
+        Times the block, the block can set 'bytes' and 'retries' of the yielded dict.
+        A raised exception is recorded as a failed stage
+        """
+        record = dict(fields, bytes=0, retries=0)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            self.record(job, stage, time.perf_counter() - start, ok=False, error=str(e), **record)
+            raise
+        self.record(job, stage, time.perf_counter() - start, **record)
+
+    def summary(self):
+        """
+        Prometheus text exposition of the recent stages
+        """
+        lines = ['# HELP render360_stage_seconds Duration of the recent send job stages.',
+                 '# TYPE render360_stage_seconds summary']
+        totals = []
+        with self.lock:
+            stages = {stage: list(samples) for stage, samples in self.samples.items()}
+        for stage, samples in sorted(stages.items()):
+            labels = f'source="{self.name}",stage="{stage}"'
+            seconds = sorted(sample[0] for sample in samples)
+            for q in QUANTILES:
+                lines.append(f'render360_stage_seconds{{{labels},quantile="{q}"}} {quantile(seconds, q):.4f}')
+            lines.append(f'render360_stage_seconds_sum{{{labels}}} {sum(seconds):.4f}')
+            lines.append(f'render360_stage_seconds_count{{{labels}}} {len(seconds)}')
+            size = sum(sample[1] for sample in samples)
+            # Throughput of the stages that move data, over the time they took
+            busy = sum(sample[0] for sample in samples if sample[1])
+            totals.append((labels, size, size / busy / 1024 / 1024 if busy else 0.0,
+                           sum(sample[2] for sample in samples), sum(1 for sample in samples if not sample[3])))
+        for name, help_text, index, number_format in (
+                ('render360_stage_bytes', 'Bytes processed by the recent stages.', 1, 'd'),
+                ('render360_stage_throughput_mb_per_second', 'MB/s of the recent stages that move data.', 2, '.3f'),
+                ('render360_stage_retries', 'Repeated Bot API requests of the recent stages.', 3, 'd'),
+                ('render360_stage_failures', 'Failed recent stages.', 4, 'd')):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            lines += [f'{name}{{{total[0]}}} {total[index]:{number_format}}' for total in totals]
+        return '\n'.join(lines) + '\n'
+
+    def write_summary(self):
+        """
+        Rewrites the textfile atomically, so the collector never reads half of it
+        """
+        temp_path = f'{self.prom_path}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.summary())
+            os.replace(temp_path, self.prom_path)
+        except OSError as message:
+            print(message)
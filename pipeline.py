@@ -0,0 +1,466 @@
+"""
+Send pipeline shared by the window and the headless watcher: files are prepared in a process pool
+and sent by one I/O thread. Nothing here imports Qt
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from bot_api import BotApi, InputFile, RateLimiter, TelegramError, backoff, count_retries, split_media_groups
+from constants import BOT_API_URL, FILE_ID_CACHE_FILE, SEND_ATTEMPTS, JOB_JOURNAL_FILE, JOB_JOURNAL_KEEP, \
+    UPLOAD_CONCURRENCY, PROGRESS_INTERVAL, MEDIA_GROUP_LIMIT, SCRATCH_DIR, SCRATCH_STALE_AGE
+from file_id_cache import FileIdCache
+import job_journal
+from metrics import Metrics
+from scratch import Scratch, tree_stat
+from progress import ProgressTracker
+import transcode_cache
+import transcoder
+from settings import TEST_MODE, BOT_ID, TRANSCODE_WORKERS, STORAGE_CHAT_ID, PROJECT_CHATS, DEFAULT_CHATS, \
+    FAKE_BOT_API_URL
+
+SHEET = 'sheet_{}'  # sent_groups mark of the contact sheet of a clip in a chat
+
+
+def make_message(project, asset, text='', wareframe=False):
+    """
+    Caption of the sent videos
+    """
+    text = text + "\n" if text else ""
+    wareframe = '#wareframe' if wareframe else ""
+    return f'{text}{project} #{asset} {wareframe}'
+
+
+def print_progress(percent, text):
+    """
+    Progress listener of the headless modes
+    """
+    if percent is not None:
+        print(f'{percent:3d}% {text}')
+
+
+class TaskThread(threading.Thread):
+    def __init__(self, queue):
+        threading.Thread.__init__(self, daemon=True)
+        self.queue = queue
+
+    def run(self):
+        asyncio.set_event_loop(asyncio.new_event_loop())  # Tasks can run coroutines on the loop of this thread
+        while True:
+            func = self.queue.get()  # Get task
+            if func:
+                func()  # Run input function
+                self.queue.task_done()
+
+
+class ThreadQueue:
+    """
+    Creates a separate thread with a queue in which functions are dropped,
+    and a process pool for CPU-heavy work. The thread is the I/O lane: tasks
+    run one by one in the order they were added, while the pool is busy
+    preparing the files of the next tasks. A second thread reads the source files
+    of new jobs, so neither the caller nor a running send waits for it.
+    """
+    def __init__(self):
+        self.queue = queue.Queue()  # Create a queue
+        self.prepare_queue = queue.Queue()
+        self.threads = []
+        self.thread = TaskThread(self.queue)
+        self.prepare_thread = TaskThread(self.prepare_queue)
+        self.threads += [self.thread, self.prepare_thread]
+        for thread in self.threads:
+            thread.start()
+        self.process_events = multiprocessing.Queue()  # (progress_id, fraction) from the pool processes
+        self.stop_event = multiprocessing.Event()
+        self.pool_lock = threading.Lock()
+        self.pool = self.create_pool()
+        self.futures = set()  # pool tasks that are not finished
+        threading.Thread(target=self.read_process_events, daemon=True).start()
+
+    def add_task(self, func):
+        self.queue.put(func)
+
+    def create_pool(self):
+        return ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS or None, initializer=transcode_cache.init_worker,
+                                   initargs=(self.process_events, self.stop_event))
+
+    def add_prepare_task(self, func):
+        self.prepare_queue.put(func)
+
+    def add_process_task(self, func, *args):
+        """
+        Run a picklable function in the process pool, returns a Future
+        """
+        with self.pool_lock:
+            try:
+                future = self.pool.submit(func, *args)
+            except BrokenProcessPool:
+                # A worker died (out of memory, crashed ffmpeg), the pool takes no more tasks
+                print('A pool process died, the pool is started again')
+                self.pool.shutdown(wait=False)
+                self.pool = self.create_pool()
+                future = self.pool.submit(func, *args)
+        self.futures.add(future)
+        future.add_done_callback(self.futures.discard)
+        return future
+
+    def read_process_events(self):
+        while True:
+            self.on_process_event(*self.process_events.get())
+
+    def on_process_event(self, progress_id, fraction):
+        pass
+
+    def shutdown(self):
+        """
+        Cancels the pool tasks that have not started and kills the running ffmpeg processes,
+        otherwise the interpreter waits for every queued encode before it exits
+        """
+        for future in list(self.futures):
+            future.cancel()
+        self.stop_event.set()
+        self.pool.shutdown(wait=False)
+
+
+class SendPipeline(ThreadQueue):
+    """
+    Journaled send jobs: data is a dict with file_path (list), project and message.
+    progress_listener(percent, text) is called from the worker threads
+    """
+    def __init__(self, token, progress_listener, journal_file=JOB_JOURNAL_FILE, progress_interval=PROGRESS_INTERVAL):
+        ThreadQueue.__init__(self)
+        self.progress = ProgressTracker(progress_listener, progress_interval)
+        self.bot = BotApi(token, base_url=FAKE_BOT_API_URL or BOT_API_URL)
+        self.rate_limiter = RateLimiter()
+        # The window, the watcher and the service run as separate processes, each one writes its own files
+        name = os.path.splitext(journal_file)[0]
+        self.file_ids = FileIdCache(os.path.join(tempfile.gettempdir(), FILE_ID_CACHE_FILE.format(name)), token)
+        self.journal = job_journal.JobJournal(os.path.join(tempfile.gettempdir(), journal_file))
+        # Job ids are only unique in one journal
+        self.scratch = Scratch(os.path.join(tempfile.gettempdir(), SCRATCH_DIR, name))
+        self.metrics = Metrics(name)
+        self.storage_chat_id = STORAGE_CHAT_ID
+
+    def submit(self, data):
+        """
+        Saves a new job to the journal and queues it, returns the job id
+        """
+        data['groups'] = []
+        data['sent_groups'] = []
+        data['job'] = self.journal.add(data)
+        self.add_prepare_task(lambda: self.start_job(data))
+        return data['job']
+
+    def start_job(self, data):
+        """
+        Task of the prepare thread, a job that can not be started is failed in the journal
+        """
+        try:
+            self.queue_job(data)
+        except Exception as message:
+            print(f'Job {data["job"]} can not be started: {message}')
+            self.journal.set_state(data['job'], job_journal.FAILED, str(message))
+            self.scratch.remove_job(data['job'])
+            self.progress.finish_job(data['job'])
+            self.on_job_finished(data)
+
+    def queue_job(self, data):
+        """
+        Starts encoding the files of the job and queues its sending. The keys are read from the
+        source files, so it runs on the prepare thread
+        """
+        data['groups'] = data.get('groups') or []
+        data['sent_groups'] = data.get('sent_groups') or []
+        data['started'] = time.perf_counter()
+        data['profile'] = transcoder.project_profile(data['project'])
+        data['scratch'] = self.scratch.job_dir(data['job'])
+        data['keys'] = [transcode_cache.video_key(each, data['profile']) for each in data['file_path']]
+        data['file_ids'] = [self.file_ids.get(key) for key in data['keys']]
+        self.progress.add_job(data['job'], len(data['file_path']))
+        data['videos'] = self.transcode_files(data)
+        data['sheets'] = [self.add_process_task(transcode_cache.prepare_sheet, path, data['scratch'])
+                          for path in data['file_path']] if data.get('contact_sheet') else []
+        data['sheet_ids'] = [None] * len(data['sheets'])
+        self.journal.set_state(data['job'], job_journal.ENCODING)
+        self.add_task(lambda: self.send_message(data))
+
+    def sweep_temp_files(self):
+        """
+        Removes working files that crashed runs left in the scratch area and the cache
+        """
+        try:
+            self.scratch.sweep()
+            transcode_cache.TranscodeCache().remove_stale_parts()
+            # Copies written next to the settings by the versions without the cache
+            for file_path in Path(tempfile.gettempdir()).glob('temp_video_*.mp4'):
+                file_path.unlink()
+            # Job folders of the versions that shared one scratch folder between the journals
+            for folder in Path(tempfile.gettempdir(), SCRATCH_DIR).glob('job_*'):
+                if time.time() - tree_stat(str(folder))[1] > SCRATCH_STALE_AGE:
+                    Scratch.remove(str(folder))
+        except OSError as message:
+            print(message)
+
+    def resume_jobs(self):
+        """
+        Queues the jobs that were not sent when the app was closed. Encoded files and uploaded
+        file_ids are cached, so they continue from the last finished stage. Returns their ids
+        """
+        self.journal.remove_finished(JOB_JOURNAL_KEEP)
+        resumed = []
+        for data in self.journal.unfinished():
+            self.add_prepare_task(lambda data=data: self.start_job(data))
+            resumed.append(data['job'])
+        return resumed
+
+    def send_message(self, data):
+        """
+        Every next try skips the clips that were uploaded by the previous ones
+        """
+        error = None
+        try:
+            for attempt in range(SEND_ATTEMPTS):
+                try:
+                    self.journal.set_state(data['job'], job_journal.UPLOADING)
+                    asyncio.get_event_loop().run_until_complete(self.send_message_async(data))
+                    self.journal.set_state(data['job'], job_journal.DONE)
+                    error = None
+                    return
+                except Exception as message:
+                    error = str(message)
+                    print(f'Sending {data["message"]!r} failed ({attempt + 1}/{SEND_ATTEMPTS}): {message}')
+                    if attempt < SEND_ATTEMPTS - 1:
+                        time.sleep(backoff(attempt))
+                    else:
+                        self.journal.set_state(data['job'], job_journal.FAILED, error)
+        finally:
+            # From queueing to the last chat, retries are the repeated send attempts
+            self.metrics.record(data['job'], 'job', time.perf_counter() - data['started'],
+                                retries=attempt, ok=error is None, error=error, files=len(data['file_path']))
+            self.metrics.write_summary()
+            self.scratch.remove_job(data['job'])
+            self.progress.finish_job(data['job'])
+            self.on_job_finished(data)
+
+    def on_job_finished(self, data):
+        pass
+
+    async def send_message_async(self, data):
+        if self.storage_chat_id:
+            try:
+                await self.upload_files(data)
+            except Exception as message:
+                # The groups upload the rest of the clips themselves
+                print(f'Pre-upload to the storage chat failed, the clips are sent with the message: {message}')
+                if isinstance(message, TelegramError) and message.error_code in (400, 403):
+                    self.storage_chat_id = None  # the chat is missing or the bot can not post there
+        if not data['groups']:
+            data['groups'] = split_media_groups(await self.upload_sizes(data))
+            self.journal.update(data)
+        chats = self.project_chats(data['project'])
+        await self.send_to_chat(data, chats[0])
+        # The rest of the chats get the already uploaded videos by file_id
+        await asyncio.gather(*(self.send_to_chat(data, chat_id) for chat_id in chats[1:]))
+
+    async def send_to_chat(self, data, chat_id):
+        await self.send_groups(data, chat_id)
+        if data['sheets']:
+            await self.send_sheets(data, chat_id)
+
+    async def upload_sizes(self, data):
+        """
+        Bytes every file adds to a media group request, 0 for the ones sent by file_id
+        """
+        sizes = []
+        for i, file_id in enumerate(data['file_ids']):
+            sizes.append(0 if file_id else os.path.getsize((await self.prepared(data, i))['path']))
+        return sizes
+
+    async def send_groups(self, data, chat_id):
+        """
+        Sends the media groups of the message to the chat in order, the caption goes with the first one.
+        Groups sent by a previous try are skipped
+        """
+        for group_index, group in enumerate(data['groups']):
+            if [chat_id, group_index] in data['sent_groups']:
+                continue
+            media = [data['file_ids'][i] or await self.input_file(data, i) for i in group]
+            await self.rate_limiter.wait(chat_id)
+            with self.metrics.stage(data['job'], 'send', chat=chat_id, group=group_index, files=len(group)) as stage:
+                retries = count_retries()
+                stage['bytes'] = sum(os.path.getsize(video.path) for video in media if isinstance(video, InputFile))
+                try:
+                    messages = await self.bot.send_videos(chat_id, media,
+                                                          data['message'] if group_index == 0 else None)
+                except TelegramError as e:
+                    if e.error_code == 400:
+                        self.forget_file_ids(data)  # a remembered file_id may be no longer valid
+                    raise
+                finally:
+                    stage['retries'] = retries[0]
+            for i, msg in zip(group, messages):
+                data['file_ids'][i] = msg['video']['file_id']
+            self.mark_sent(data, chat_id, group_index)  # first, the group is delivered whatever happens next
+            for i in group:
+                self.file_ids.set(data['keys'][i], data['file_ids'][i])
+
+    async def send_sheets(self, data, chat_id):
+        """
+        Contact sheets of the clips go after the videos as photo albums.
+        A clip without a sheet does not stop the message, sheets sent by a previous try are skipped
+        """
+        photos = []
+        for i, sheet in enumerate(data['sheets']):
+            if [chat_id, SHEET.format(i)] in data['sent_groups']:
+                continue
+            if data['sheet_ids'][i]:
+                photos.append((i, data['sheet_ids'][i]))
+                continue
+            try:
+                photos.append((i, InputFile(await asyncio.wrap_future(sheet), 'image/jpeg')))
+            except Exception as message:
+                print(f'No contact sheet of {data["file_path"][i]}: {message}')
+        for start in range(0, len(photos), MEDIA_GROUP_LIMIT):
+            album = photos[start:start + MEDIA_GROUP_LIMIT]
+            await self.rate_limiter.wait(chat_id)
+            messages = await self.bot.send_photos(chat_id, [photo for _, photo in album])
+            for (i, _), msg in zip(album, messages):
+                data['sheet_ids'][i] = msg['photo'][-1]['file_id']  # the largest size
+            self.mark_sent(data, chat_id, *(SHEET.format(i) for i, _ in album))
+
+    def mark_sent(self, data, chat_id, *group_indexes):
+        """
+        A resumed job does not send these groups to the chat again
+        """
+        data['sent_groups'] += [[chat_id, group_index] for group_index in group_indexes]
+        self.journal.update(data)
+
+    @staticmethod
+    def project_chats(project):
+        """
+        Chats the project renders are sent to, the first one receives the upload
+        """
+        if TEST_MODE:
+            return [BOT_ID]
+        return list(PROJECT_CHATS.get(project, DEFAULT_CHATS))
+
+    async def upload_files(self, data):
+        """
+        Uploads every file to the storage chat as soon as the pool finishes encoding it,
+        so the network works while the next files are still being encoded.
+        Files with a remembered file_id are not uploaded at all.
+        Returns Telegram file_ids in the order of the files
+        """
+        chat_id = self.storage_chat_id
+        file_ids = data['file_ids']  # filled in place, so a retry resumes from the uploaded clips
+        uploads = []
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+
+        async def upload(i):
+            video = await self.input_file(data, i)
+            async with semaphore:
+                with self.metrics.stage(data['job'], 'upload', clip=i) as stage:
+                    retries = count_retries()  # gather runs every upload in its own task
+                    stage['bytes'] = os.path.getsize(video.path)
+                    try:
+                        msg = await self.bot.send_video(chat_id, video, disable_notification=True)
+                    finally:
+                        stage['retries'] = retries[0]
+            uploads.append(msg['message_id'])
+            file_ids[i] = msg['video']['file_id']
+            self.file_ids.set(data['keys'][i], file_ids[i])
+
+        results = await asyncio.gather(*(upload(i) for i, video in enumerate(data['videos'])
+                                         if video and not file_ids[i]),
+                                       return_exceptions=True)
+        # file_ids stay valid after the message is deleted
+        await asyncio.gather(*(self.bot.delete_message(chat_id, message_id) for message_id in uploads),
+                             return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return list(file_ids)
+
+    def forget_file_ids(self, data):
+        """
+        Drops the file_ids of the message, the files that were not encoded for it are sent to the pool
+        """
+        self.file_ids.discard(data['keys'])
+        for i in range(len(data['file_path'])):
+            data['file_ids'][i] = None
+            if not data['videos'][i]:
+                data['videos'][i] = self.transcode_file(data, i)
+
+    async def prepared(self, data, i):
+        """
+        Cache entry of the prepared file, a file lost with a crashed pool process is prepared once more
+        """
+        try:
+            return await asyncio.wrap_future(data['videos'][i])
+        except BrokenProcessPool:
+            data['videos'][i] = self.transcode_file(data, i)
+            return await asyncio.wrap_future(data['videos'][i])
+
+    async def input_file(self, data, i):
+        """
+        Waits for the pool to prepare the file and returns it ready for upload with its poster and metadata
+        """
+        entry = await self.prepared(data, i)
+        return InputFile(entry['path'], on_read=self.upload_progress(data, i), thumb=entry['thumb'],
+                         width=entry['width'], height=entry['height'], duration=entry['duration'])
+
+    def upload_progress(self, data, i):
+        return lambda sent, total: self.progress.uploaded(data['job'], i, sent, total)
+
+    def on_process_event(self, progress_id, fraction):
+        self.progress.encoded(*progress_id, fraction)
+
+    def transcode_files(self, data):
+        """
+        Starts preparing every file of a batch in the process pool, returns a list of futures
+        with paths to files that fit into the Telegram limit, None for files that are already uploaded
+        """
+        videos = []
+        for i, file_id in enumerate(data['file_ids']):
+            if file_id:
+                self.progress.uploaded(data['job'], i, 1, 1)
+                videos.append(None)
+            else:
+                videos.append(self.transcode_file(data, i))
+        return videos
+
+    def transcode_file(self, data, i):
+        job = data['job']
+        submitted = time.perf_counter()
+        future = self.add_process_task(transcode_cache.prepare, data['file_path'][i], (job, i), data['profile'],
+                                       data['scratch'])
+        future.add_done_callback(lambda _: self.progress.encoded(job, i, 1.0))
+        future.add_done_callback(lambda f: self.record_transcode(job, i, f, time.perf_counter() - submitted))
+        return future
+
+    def record_transcode(self, job, i, future, seconds):
+        """
+        Stages of the pool from the timings of the prepared entry, seconds include the wait for a free process
+        """
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.metrics.record(job, 'encode', seconds, ok=False, error=str(future.exception()), clip=i)
+            return
+        entry = future.result()
+        timings = entry.get('timings', {})
+        if timings.get('action') == 'cached':
+            self.metrics.record(job, 'cache_hit', timings['lookup'], clip=i, queued=round(seconds, 4))
+            return
+        self.metrics.record(job, 'probe', timings.get('probe', 0.0), clip=i, action=timings.get('action'))
+        if 'encode' in timings:  # remuxed or encoded, the throughput is of the source bytes
+            output_bytes = os.path.getsize(entry['path']) if os.path.exists(entry['path']) else 0
+            self.metrics.record(job, 'encode', timings['encode'], timings['source_bytes'], clip=i,
+                                action=timings['action'], output_bytes=output_bytes, queued=round(seconds, 4))
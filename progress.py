@@ -0,0 +1,92 @@
+"""
+Progress of send jobs collected from the encoders and the uploads
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from constants import PROGRESS_INTERVAL
+
+
+class JobState:
+    def __init__(self, count):
+        self.encoded = [0.0] * count  # fraction of every file
+        self.sent = [0] * count  # uploaded bytes of every file
+        self.total = [0] * count  # bytes to upload, 0 until the upload starts
+
+    def percent(self):
+        count = len(self.encoded)
+        uploaded = sum(sent / total if total else 0.0 for sent, total in zip(self.sent, self.total))
+        return int(100 * (sum(self.encoded) + uploaded) / (2 * count)) if count else 100
+
+    def text(self):
+        encoded = sum(1 for fraction in self.encoded if fraction >= 1.0)
+        mb = 1024 * 1024
+        return (f'encoded {encoded}/{len(self.encoded)}, '
+                f'uploaded {sum(self.sent) / mb:.1f}/{sum(self.total) / mb:.1f} MB')
+
+
+class ProgressTracker:
+    """
+    Collects events of the queued jobs from any thread and passes a summary of the current job
+    to listener(percent, text), not more often than once per interval. percent is None when
+    there is nothing left to send
+    """
+    def __init__(self, listener, interval=PROGRESS_INTERVAL):
+        self.listener = listener
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.finished = 0
+        self.last_report = 0.0
+
+    def add_job(self, job_id, count):
+        with self.lock:
+            self.jobs[job_id] = JobState(count)
+        self.report(force=True)
+
+    def encoded(self, job_id, index, fraction):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                job.encoded[index] = max(job.encoded[index], fraction)
+        self.report()
+
+    def uploaded(self, job_id, index, sent, total):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                job.encoded[index] = 1.0
+                job.sent[index], job.total[index] = sent, total
+        self.report()
+
+    def finish_job(self, job_id):
+        with self.lock:
+            if self.jobs.pop(job_id, None):
+                self.finished += 1
+            if not self.jobs:
+                self.finished = 0
+        self.report(force=True)
+
+    def job_progress(self, job_id):
+        """
+        (percent, text) of a queued job, None if the job is not in the queue
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return (job.percent(), job.text()) if job else None
+
+    def report(self, force=False):
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_report < self.interval:
+                return
+            self.last_report = now
+            if not self.jobs:
+                percent, text = None, ''
+            else:
+                job = next(iter(self.jobs.values()))
+                position = self.finished + 1
+                percent = job.percent()
+                text = f'Message {position}/{position + len(self.jobs) - 1}: {job.text()}'
+        self.listener(percent, text)
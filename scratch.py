@@ -0,0 +1,102 @@
+"""
+Scratch area with a working directory per job, so intermediate files never outlive their job
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from constants import SCRATCH_DIR, SCRATCH_STALE_AGE
+from settings import SCRATCH_SIZE
+
+
+def tree_stat(path):
+    """
+    Total size and the newest modification time of the files under path
+    """
+    size, newest = 0, os.path.getmtime(path)
+    for folder, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(folder, name))
+            except OSError:
+                continue
+            size += stat.st_size
+            newest = max(newest, stat.st_mtime)
+    return size, newest
+
+
+class Scratch:
+    def __init__(self, root=None, max_size=SCRATCH_SIZE):
+        self.root = root or os.path.join(tempfile.gettempdir(), SCRATCH_DIR)
+        self.max_size = max_size
+        self.active = set()
+        self.lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def job_dir(self, job_id):
+        """
+        Working directory of the job, created on the first call
+        """
+        path = os.path.join(self.root, f'job_{job_id}')
+        with self.lock:
+            self.active.add(path)
+        os.makedirs(path, exist_ok=True)
+        self.enforce_size()
+        return path
+
+    def remove_job(self, job_id):
+        path = os.path.join(self.root, f'job_{job_id}')
+        with self.lock:
+            self.active.discard(path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    def entries(self):
+        """
+        (newest mtime, size, path) of every job directory that is not in use, the oldest first
+        """
+        result = []
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.path in self.active:
+                    continue
+                try:
+                    size, newest = tree_stat(entry.path) if entry.is_dir() else (entry.stat().st_size,
+                                                                                 entry.stat().st_mtime)
+                except OSError:
+                    continue
+                result.append((newest, size, entry.path))
+        return sorted(result)
+
+    @staticmethod
+    def remove(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def enforce_size(self):
+        """
+        Removes the oldest directories that no running job uses while the scratch area is over max_size
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self.remove(path)
+            total -= size
+
+    def sweep(self, max_age=SCRATCH_STALE_AGE):
+        """
+        Startup cleanup: removes what crashed runs left behind. Directories written to within
+        max_age may belong to another running instance and are kept
+        """
+        now = time.time()
+        for newest, _, path in self.entries():
+            if now - newest > max_age:
+                self.remove(path)
@@ -0,0 +1,115 @@
+"""
+Send service for the local network: workstations submit jobs with paths on a shared drive, this node
+encodes them and sends them with one pooled, rate-limited bot. Point the window to it with the
+SEND_SERVICE_URL environment variable (see settings.py).
+
+    SEND_SERVICE_KEY=... python send_service.py --port 8360
+    POST /jobs {"file_path": ["//share/renders/chair_360.mp4"], "project": "#ardena", "message": "#ardena #chair"}
+    GET /jobs/{job} -> {"job": 1, "state": "uploading", "error": null, "percent": 60, "text": "..."}
+"""
+import argparse
+import os
+
+from aiohttp import web
+from environs import Env
+
+from constants import SERVICE_JOURNAL_FILE, SERVICE_PORT, WATCH_PROGRESS_INTERVAL
+import frame_sequence
+import job_journal
+from pipeline import SendPipeline, print_progress
+from settings import PROJECT_LIST, SEND_SERVICE_KEY
+
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+class SendService(SendPipeline):
+    def __init__(self, token, key=SEND_SERVICE_KEY):
+        SendPipeline.__init__(self, token, print_progress, SERVICE_JOURNAL_FILE, WATCH_PROGRESS_INTERVAL)
+        self.key = key
+        self.app = web.Application(middlewares=[self.check_key])
+        self.app.router.add_post('/jobs', self.post_job)
+        self.app.router.add_get('/jobs/{job}', self.get_job)
+        self.sweep_temp_files()
+        self.resume_jobs()
+
+    @web.middleware
+    async def check_key(self, request, handler):
+        if self.key and request.headers.get('X-Service-Key') != self.key:
+            return self.error(403, 'wrong service key')
+        return await handler(request)
+
+    @staticmethod
+    def error(status, description):
+        return web.json_response({'error': description}, status=status)
+
+    @staticmethod
+    def read_job(params):
+        """
+        Job fields of a request, ValueError if they can not be sent
+        """
+        if not isinstance(params, dict):
+            raise ValueError('the job must be a JSON object')
+        file_path = params.get('file_path')
+        if not isinstance(file_path, list) or not file_path or not all(isinstance(each, str) for each in file_path):
+            raise ValueError('file_path must be a list of paths')
+        missing = [each for each in file_path if not (os.path.isdir(os.path.dirname(each))
+                                                      if frame_sequence.is_sequence(each) else os.path.isfile(each))]
+        if missing:
+            raise ValueError(f'files are not available on the service node: {", ".join(missing)}')
+        if params.get('project') not in PROJECT_LIST:
+            raise ValueError(f'unknown project {params.get("project")!r}')
+        if not isinstance(params.get('message'), str):
+            raise ValueError('message must be a string')
+        return {'file_path': file_path, 'project': params['project'], 'message': params['message'],
+                'contact_sheet': bool(params.get('contact_sheet'))}
+
+    async def post_job(self, request):
+        try:
+            data = self.read_job(await request.json())
+        except ValueError as e:
+            return self.error(400, str(e))
+        job = self.submit(data)  # the files are read on the prepare thread
+        return web.json_response(self.job_status(job), status=201)
+
+    async def get_job(self, request):
+        try:
+            status = self.job_status(int(request.match_info['job']))
+        except ValueError:
+            status = None
+        if status is None:
+            return self.error(404, 'no such job')
+        return web.json_response(status)
+
+    def job_status(self, job_id):
+        data = self.journal.get(job_id)
+        if data is None:
+            return None
+        progress = self.progress.job_progress(job_id)
+        if progress:
+            percent, text = progress
+        else:
+            percent, text = (100 if data['state'] == job_journal.DONE else 0), data['state']
+        return {'job': job_id, 'state': data['state'], 'error': data['error'], 'percent': percent, 'text': text}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+
+    env = Env()
+    env.read_env()
+    if not SEND_SERVICE_KEY and args.host not in LOCAL_HOSTS:
+        parser.error(f'set SEND_SERVICE_KEY to listen on {args.host}, without it only local clients are allowed')
+    service = SendService(env('BOT_TOKEN'))
+    try:
+        web.run_app(service.app, host=args.host, port=args.port)
+    finally:
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,60 @@
+"""
+Client of send_service.py, used by the window when SEND_SERVICE_URL is set.
+aiohttp is imported on the first request, it is not needed to show the window
+"""
+import asyncio
+import json
+
+from bot_api import backoff
+from constants import REQUEST_ATTEMPTS
+from settings import SEND_SERVICE_KEY
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    def __init__(self, url, key=SEND_SERVICE_KEY, attempts=REQUEST_ATTEMPTS):
+        self.url = url.rstrip('/')
+        self.headers = {'X-Service-Key': key} if key else {}
+        self.attempts = attempts
+        self.session = None
+
+    def get_session(self):
+        import aiohttp
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(headers=self.headers, timeout=aiohttp.ClientTimeout(total=60))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method, path, params=None):
+        """
+        Repeats the request while the service is unreachable, a refused job raises ServiceError at once
+        """
+        import aiohttp
+        for attempt in range(self.attempts):
+            try:
+                async with self.get_session().request(method, f'{self.url}{path}', json=params) as response:
+                    result = await response.json(content_type=None)
+                    if response.status >= 400:
+                        raise ServiceError(result.get('error', response.reason))
+                    return result
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+                if attempt == self.attempts - 1:
+                    raise ServiceError(f'send service is not available: {e}')
+                await asyncio.sleep(backoff(attempt))
+
+    async def submit(self, data):
+        """
+        Queues the job on the service, returns its status
+        """
+        fields = ('file_path', 'project', 'message', 'contact_sheet')
+        return await self.request('POST', '/jobs', {key: data.get(key) for key in fields})
+
+    async def status(self, job_id):
+        return await self.request('GET', f'/jobs/{job_id}')
@@ -1,7 +1,58 @@
+from environs import Env
+
+env = Env()
+env.read_env()  # the .env file, so the values below can be set there as well as in the environment
 
 PROJECT_LIST = "#ardena", "#MGS", "#alaska", "#amber", "#wwz", "#bvr", "#thunder", "#redsand", "#ISS2"
 
 BOT_ID = 476369950
 ARDENA_BOT_ID = -1001948513915
 RENDER_BOT_ID = -1001719029113
-TEST_MODE = False
\ No newline at end of file
+TEST_MODE = False
+# Url of a local fake_bot_api.py server, everything is sent there instead of Telegram
+FAKE_BOT_API_URL = env.str('FAKE_BOT_API_URL', None)
+# Url of a send_service.py node, e.g. http://render-node:8360. The window then only submits jobs there and
+# shows their progress, the encodes and the bot run on that node. SEND_SERVICE_KEY must match on both sides
+SEND_SERVICE_URL = env.str('SEND_SERVICE_URL', None)
+SEND_SERVICE_KEY = env.str('SEND_SERVICE_KEY', None)
+
+# Chats every project is sent to, projects that are not listed go to DEFAULT_CHATS
+DEFAULT_CHATS = (RENDER_BOT_ID,)
+PROJECT_CHATS = {
+    "#ardena": (RENDER_BOT_ID, ARDENA_BOT_ID),
+}
+
+TRANSCODE_WORKERS = 0  # processes for video encoding, 0 - one per CPU core
+# Private channel (the bot is its admin) clips are pre-uploaded to while the rest encode, e.g. -1001234567890.
+# None - every media group is uploaded at once
+STORAGE_CHAT_ID = None
+TRANSCODE_CACHE_SIZE = 5 * 1024 ** 3  # bytes of encoded videos kept between sends
+FILE_ID_CACHE_ITEMS = 5000  # uploaded videos whose Telegram file_id is remembered
+
+# Encode profiles for files that have to be re-encoded. mode: 'bitrate' - one pass to the size-targeted
+# bitrate, 'two_pass' - two passes to the same bitrate, 'crf' - constant quality capped by that bitrate.
+# Turntables are mostly a static background, long keyframe intervals save a lot of size on them.
+ENCODE_PROFILES = {
+    'preview': {'mode': 'bitrate', 'preset': 'veryfast', 'threads': 0, 'max_width': 1280, 'max_height': 720,
+                'keyframe_interval': 300},
+    'two_pass': {'mode': 'two_pass', 'preset': 'medium', 'threads': 0, 'max_width': 1920, 'max_height': 1080,
+                 'keyframe_interval': 300},
+    'quality': {'mode': 'crf', 'crf': 18, 'preset': 'slow', 'threads': 0, 'max_width': 3840, 'max_height': 2160,
+                'keyframe_interval': 300},
+}
+DEFAULT_ENCODE_PROFILE = 'two_pass'
+PROJECT_ENCODE_PROFILES = {  # projects that are not listed use DEFAULT_ENCODE_PROFILE
+    "#ardena": 'quality',
+}
+SCRATCH_SIZE = 2 * 1024 ** 3  # bytes of working files, the oldest finished jobs are removed above it
+
+# Rules of the watcher: regular expressions matched against the path with / separators. The named
+# groups project (without #) and asset build the caption, the first matching rule wins. Files that
+# match no rule are skipped
+WATCH_RULES = (
+    r'/(?P<project>[^/]+)/(?:[^/]+/)*renders?/(?:[^/]+/)*(?P<asset>[^/]+?)(?:_360|_turntable)?(?:[._]v?\d+)*\.\w+$',
+)
+WATCH_MAX_JOBS = 4  # jobs the watcher keeps in the pipeline, the next found files wait for a free slot
+SEQUENCE_FRAME_RATE = 30  # frames per second of the videos encoded from frame sequences
+CONTACT_SHEET_FRAMES = 16  # evenly spaced frames of a clip on its contact sheet
+METRICS_DIR = env.str('RENDER_360_METRICS_DIR', None)  # folder of the metrics files, None - the temp folder
@@ -0,0 +1,44 @@
+"""
+Pattern paths of frame sequences against ordinary files with # in the name
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frame_sequence
+
+
+class IsSequenceTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for number in range(1, 6):
+            open(os.path.join(self.folder, f'#ardena_chair.{number:04d}.png'), 'wb').close()
+        open(os.path.join(self.folder, '#ardena_chair.mp4'), 'wb').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.folder, name).replace('\\', '/')
+
+    def test_pattern(self):
+        self.assertTrue(frame_sequence.is_sequence(self.path('#ardena_chair.####.png')))
+        sequence = frame_sequence.load(self.path('#ardena_chair.####.png'))
+        self.assertEqual((sequence.first, sequence.last), (1, 5))
+
+    def test_tagged_video(self):
+        self.assertFalse(frame_sequence.is_sequence(self.path('#ardena_chair.mp4')))
+
+    def test_not_an_image_pattern(self):
+        self.assertFalse(frame_sequence.is_sequence(self.path('#ardena_chair.####.mov')))
+        self.assertFalse(frame_sequence.is_sequence(self.path('chair_#1.png')))
+
+
+if __name__ == '__main__':
+    unittest.main()
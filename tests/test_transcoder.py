@@ -0,0 +1,101 @@
+"""
+parse_probe on the stderr ffmpeg prints for real renders
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcoder
+
+TAGGED_H264 = '''Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'chair_360.mp4':
+  Metadata:
+    major_brand     : isom
+    minor_version   : 512
+    compatible_brands: isomiso2avc1mp41
+    encoder         : Lavf58.76.100
+  Duration: 00:00:12.00, start: 0.000000, bitrate: 4915 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(tv, bt709, progressive), 1920x1080 \
+[SAR 1:1 DAR 16:9], 4779 kb/s, 30 fps, 30 tbr, 15360 tbn (default)
+    Metadata:
+      handler_name    : VideoHandler
+      vendor_id       : [0][0][0][0]
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, 128 kb/s (default)
+    Metadata:
+      handler_name    : SoundHandler
+      vendor_id       : [0][0][0][0]
+At least one output file must be specified
+'''
+
+UNTAGGED_H264 = '''Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'chair_360.mp4':
+  Metadata:
+    major_brand     : isom
+    minor_version   : 512
+    compatible_brands: isomiso2avc1mp41
+    encoder         : Lavf58.29.100
+  Duration: 00:00:10.00, start: 0.000000, bitrate: 2036 kb/s
+    Stream #0:0(und): Video: h264 (High) (avc1 / 0x31637661), yuv420p, 1280x720, 2033 kb/s, 25 fps, 25 tbr, \
+12800 tbn, 50 tbc (default)
+    Metadata:
+      handler_name    : VideoHandler
+At least one output file must be specified
+'''
+
+PNG_FRAME = '''Input #0, png_pipe, from 'chair.0001.png':
+  Duration: N/A, bitrate: N/A
+    Stream #0:0: Video: png, rgba(pc), 2048x2048, 25 tbr, 25 tbn, 25 tbc
+At least one output file must be specified
+'''
+
+PRORES = '''Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'chair_360.mov':
+  Metadata:
+    major_brand     : qt
+    minor_version   : 512
+    compatible_brands: qt
+    encoder         : Lavf58.29.100
+  Duration: 00:00:08.00, start: 0.000000, bitrate: 147565 kb/s
+    Stream #0:0(eng): Video: prores (HQ) (apch / 0x68637061), yuv422p10le(tv, bt709, progressive), 1920x1080, \
+147559 kb/s, SAR 1:1 DAR 16:9, 25 fps, 25 tbr, 12800 tbn, 12800 tbc (default)
+    Metadata:
+      handler_name    : VideoHandler
+      encoder         : Apple ProRes 422 HQ
+At least one output file must be specified
+'''
+
+
+class ParseProbeTest(unittest.TestCase):
+    def test_tagged_h264(self):
+        info = transcoder.parse_probe('chair_360.mp4', 7372800, TAGGED_H264)
+        self.assertEqual((info.video_codec, info.pix_fmt, info.width, info.height), ('h264', 'yuv420p', 1920, 1080))
+        self.assertEqual(info.audio_codec, 'aac')
+        self.assertEqual(info.format_name, 'mov,mp4,m4a,3gp,3g2,mj2')
+        self.assertEqual(info.duration, 12.0)
+        self.assertEqual(info.bitrate, 4915000)
+        self.assertTrue(transcoder.is_compatible(info))
+
+    def test_untagged_h264(self):
+        info = transcoder.parse_probe('chair_360.mp4', 2545000, UNTAGGED_H264)
+        self.assertEqual((info.video_codec, info.pix_fmt, info.width, info.height), ('h264', 'yuv420p', 1280, 720))
+        self.assertIsNone(info.audio_codec)
+        self.assertTrue(transcoder.is_compatible(info))
+
+    def test_png_frame(self):
+        info = transcoder.parse_probe('chair.0001.png', 6291456, PNG_FRAME)
+        self.assertEqual((info.video_codec, info.pix_fmt, info.width, info.height), ('png', 'rgba', 2048, 2048))
+        self.assertEqual(info.format_name, 'png_pipe')
+        self.assertEqual(info.duration, 0.0)
+        self.assertFalse(transcoder.is_compatible(info))
+
+    def test_prores(self):
+        info = transcoder.parse_probe('chair_360.mov', 147565000, PRORES)
+        self.assertEqual((info.video_codec, info.pix_fmt, info.width, info.height),
+                         ('prores', 'yuv422p10le', 1920, 1080))
+        self.assertEqual(info.duration, 8.0)
+        self.assertEqual(transcoder.plan(info), transcoder.ENCODE)
+
+
+if __name__ == '__main__':
+    unittest.main()
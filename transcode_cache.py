@@ -0,0 +1,243 @@
+"""
+Persistent cache of encoded videos, addressed by a fingerprint of the source file and the encoder settings.
+Every entry also keeps a poster frame and the metadata Telegram shows before the video is loaded
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import contact_sheet
+import frame_sequence
+import transcoder
+from constants import TRANSCODE_CACHE_DIR, FINGERPRINT_BLOCK, MAX_UPLOAD_SIZE, CACHE_MIN_AGE, SCRATCH_STALE_AGE, \
+    CONTACT_SHEET_CELL, STOP_POLL_INTERVAL
+from settings import TRANSCODE_CACHE_SIZE, CONTACT_SHEET_FRAMES
+
+
+def fingerprint(path, block=FINGERPRINT_BLOCK):
+    """
+    Fast content fingerprint: size, mtime and a hash of the first and the last block of the file
+    """
+    if frame_sequence.is_sequence(path):
+        return frame_sequence.fingerprint(path)
+    stat = os.stat(path)
+    digest = hashlib.blake2b(f'{stat.st_size}:{stat.st_mtime_ns}'.encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(block))
+        if stat.st_size > block * 2:
+            f.seek(-block, os.SEEK_END)
+            digest.update(f.read(block))
+    return digest.hexdigest()
+
+
+class TranscodeCache:
+    """
+    Directory of encoded videos, posters and entry files named by cache key. The modification time
+    of a file is its last use, the least recently used files are removed when the directory gets over max_size
+    """
+    def __init__(self, folder=None, max_size=TRANSCODE_CACHE_SIZE):
+        self.folder = folder or os.path.join(tempfile.gettempdir(), TRANSCODE_CACHE_DIR)
+        self.max_size = max_size
+        os.makedirs(self.folder, exist_ok=True)
+
+    @staticmethod
+    def key(path, signature):
+        digest = hashlib.blake2b(f'{fingerprint(path)}:{signature}'.encode(), digest_size=16)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, f'{key}.mp4')
+
+    def thumb_path(self, key):
+        return os.path.join(self.folder, f'{key}.jpg')
+
+    def entry_path(self, key):
+        return os.path.join(self.folder, f'{key}.json')
+
+    def get(self, key):
+        """
+        Cached entry {'path', 'thumb', 'width', 'height', 'duration'} or None,
+        a hit marks its files as recently used
+        """
+        try:
+            with open(self.entry_path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            for file_path in (self.entry_path(key), entry['path'], entry['thumb']):
+                if file_path and file_path.startswith(self.folder):
+                    os.utime(file_path)
+            if not os.path.exists(entry['path']):
+                return None
+        except (OSError, KeyError):  # evicted by another process
+            return None
+        return entry
+
+    def temp_path(self, folder=None):
+        """
+        Unique name for a file being written, it is moved to its key path when complete.
+        folder must be on the same drive as the cache
+        """
+        return os.path.join(folder or self.folder, f'{uuid.uuid4().hex}.part')
+
+    def remove_stale_parts(self, max_age=SCRATCH_STALE_AGE):
+        """
+        Removes the unfinished files of crashed runs
+        """
+        now = time.time()
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.name.endswith('.part') and now - entry.stat().st_mtime > max_age:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def put(self, key, temp_path):
+        cached = self.path(key)
+        os.replace(temp_path, cached)  # atomic, a concurrent encode of the same file just wins or loses
+        return cached
+
+    def put_entry(self, key, entry):
+        temp_path = self.temp_path()
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, self.entry_path(key))
+        self.evict()
+        return entry
+
+    def evict(self):
+        """
+        Removes the least recently used files over max_size, files used within CACHE_MIN_AGE are kept
+        """
+        files = []
+        total = 0
+        min_time = time.time() - CACHE_MIN_AGE
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.part'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for mtime, size, file_path in sorted(files):
+            if total <= self.max_size or mtime > min_time:
+                break
+            try:
+                os.remove(file_path)
+                total -= size
+            except OSError:  # removed by another process or still open
+                pass
+
+
+def video_key(path, profile_name=None, max_size=MAX_UPLOAD_SIZE):
+    """
+    Key of the video that will be sent for this source file
+    """
+    return TranscodeCache.key(path, transcoder.encode_signature(max_size, profile_name))
+
+
+progress_queue = None  # set in every process of the pool
+
+
+def init_worker(queue, stop_event):
+    """
+    Initializer of the pool processes, encode progress is sent to the queue as (progress_id, fraction).
+    Setting stop_event kills the ffmpeg processes of the worker
+    """
+    global progress_queue
+    progress_queue = queue
+    threading.Thread(target=stop_on, args=(stop_event,), daemon=True).start()
+
+
+def stop_on(stop_event):
+    # Polled, Event.set() blocks forever on a worker that died while it waited on the event
+    while not stop_event.is_set():
+        time.sleep(STOP_POLL_INTERVAL)
+    transcoder.stop_processes()
+
+
+def prepare(path, progress_id=None, profile_name=None, work_dir=None, max_size=MAX_UPLOAD_SIZE):
+    """
+    Cached version of transcoder.prepare with a poster frame, runs in the process pool.
+    Intermediate files are written to work_dir. Returns the cache entry of the video to send,
+    with the seconds of every step in 'timings' (not saved in the cache)
+    """
+    start = time.perf_counter()
+    cache = TranscodeCache()
+    key = cache.key(path, transcoder.encode_signature(max_size, profile_name))
+    entry = cache.get(key)
+    if entry:
+        entry['timings'] = {'lookup': time.perf_counter() - start, 'action': 'cached'}
+        return entry
+    timings = {'lookup': time.perf_counter() - start}
+    start = time.perf_counter()
+    info = frame_sequence.probe(path) if frame_sequence.is_sequence(path) else transcoder.probe(path)
+    action = transcoder.plan(info, max_size)
+    timings.update(probe=time.perf_counter() - start, action=action, source_bytes=info.size)
+    if action != transcoder.SEND:
+        start = time.perf_counter()
+        temp_path = cache.temp_path(work_dir)
+        try:
+            on_progress = None
+            if progress_queue is not None and progress_id is not None:
+                on_progress = lambda fraction: progress_queue.put((progress_id, fraction))
+            if action == transcoder.REMUX:
+                transcoder.remux(info, temp_path)
+            else:
+                transcoder.encode(info, temp_path, transcoder.target_bitrate(info, max_size), on_progress,
+                                  transcoder.get_profile(profile_name))
+            info = transcoder.probe(cache.put(key, temp_path))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        timings['encode'] = time.perf_counter() - start
+    start = time.perf_counter()
+    thumb = cache.thumb_path(key)
+    temp_thumb = cache.temp_path(work_dir)
+    try:
+        transcoder.extract_poster(info.path, temp_thumb)
+        os.replace(temp_thumb, thumb)
+    except (transcoder.TranscodeError, OSError) as message:
+        print(message)
+        thumb = None
+    finally:
+        if os.path.exists(temp_thumb):
+            os.remove(temp_thumb)
+    timings['poster'] = time.perf_counter() - start
+    entry = cache.put_entry(key, {'path': info.path, 'thumb': thumb, 'width': info.width, 'height': info.height,
+                                  'duration': int(round(info.duration))})
+    entry['timings'] = timings
+    return entry
+
+
+def prepare_sheet(path, work_dir=None, count=CONTACT_SHEET_FRAMES):
+    """
+    Cached contact sheet of a clip or a frame sequence, runs in the process pool. Returns the jpeg path
+    """
+    cache = TranscodeCache()
+    key = cache.key(path, f'sheet-{count}-{CONTACT_SHEET_CELL}')
+    sheet = cache.thumb_path(key)
+    try:
+        os.utime(sheet)
+        return sheet
+    except OSError:
+        pass
+    info = frame_sequence.probe(path) if frame_sequence.is_sequence(path) else transcoder.probe(path)
+    temp_path = cache.temp_path(work_dir)
+    try:
+        contact_sheet.make(info, temp_path, count)
+        os.replace(temp_path, sheet)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    cache.evict()
+    return sheet
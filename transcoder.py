@@ -0,0 +1,383 @@
+"""
+Probing and size-targeted re-encoding of videos with the ffmpeg binary bundled in imageio_ffmpeg
+"""
+import contextlib
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+
+from constants import MAX_UPLOAD_SIZE, AUDIO_BITRATE, MIN_VIDEO_BITRATE, BITRATE_SAFETY, COMPATIBLE_VIDEO_CODECS, \
+    COMPATIBLE_PIX_FMTS, COMPATIBLE_AUDIO_CODECS, COMPATIBLE_EXTENSIONS, TELEGRAM_THUMB_SIZE, FRAME_COPY_BUFFER
+from settings import ENCODE_PROFILES, DEFAULT_ENCODE_PROFILE, PROJECT_ENCODE_PROFILES
+
+# Do not flash a console window for every ffmpeg call in the windowed exe
+CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+
+# ffmpeg processes started by this process, killed by stop_processes when the app is closed
+running = set()
+running_lock = threading.Lock()
+stopping = threading.Event()
+
+FORMAT_RE = re.compile(r'Input #0, (\S+), from')
+DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+BITRATE_RE = re.compile(r'Duration:.*?bitrate:\s*(\d+)\s*kb/s')
+# The pixel format may carry a color description with commas: yuv420p(tv, bt709, progressive)
+VIDEO_RE = re.compile(r'Stream #\d+:\d+.*?: Video:\s*(\w+)[^,]*,\s*(\w+)(?:\([^)]*\))?,\s*(\d{2,5})x(\d{2,5})')
+AUDIO_RE = re.compile(r'Stream #\d+:\d+.*?: Audio:\s*(\w+)')
+
+
+class TranscodeError(Exception):
+    pass
+
+
+class VideoInfo:
+    """
+    Result of probing a video file
+    """
+    def __init__(self, path, size, duration=0.0, bitrate=0, video_codec=None, audio_codec=None,
+                 pix_fmt=None, width=0, height=0, format_name=None, faststart=False):
+        self.path = path
+        self.size = size  # bytes
+        self.duration = duration  # seconds
+        self.bitrate = bitrate  # bit/s
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.pix_fmt = pix_fmt
+        self.width = width
+        self.height = height
+        self.format_name = format_name  # ffmpeg demuxer, e.g. 'mov,mp4,m4a,3gp,3g2,mj2'
+        self.faststart = faststart  # the index is in front of the media data, players start at once
+
+    def __repr__(self):
+        return (f'VideoInfo({self.path!r}, size={self.size}, duration={self.duration}, '
+                f'bitrate={self.bitrate}, video={self.video_codec}/{self.pix_fmt} {self.width}x{self.height}, '
+                f'audio={self.audio_codec})')
+
+    def input_args(self):
+        """
+        ffmpeg arguments that open the source
+        """
+        return ['-i', self.path]
+
+    def input_frames(self):
+        """
+        Image files to stream to the stdin of ffmpeg, None if ffmpeg reads the source itself
+        """
+        return None
+
+
+def ffmpeg_exe():
+    import imageio_ffmpeg  # only the pool processes need it
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def project_profile(project):
+    """
+    Name of the encode profile of a project
+    """
+    return PROJECT_ENCODE_PROFILES.get(project, DEFAULT_ENCODE_PROFILE)
+
+
+def get_profile(name=None):
+    return ENCODE_PROFILES[name or DEFAULT_ENCODE_PROFILE]
+
+
+@contextlib.contextmanager
+def ffmpeg_process(command, **kwargs):
+    """
+    Popen of an ffmpeg command that stop_processes can kill
+    """
+    with running_lock:
+        if stopping.is_set():
+            raise TranscodeError('ffmpeg is stopped')
+        process = subprocess.Popen(command, creationflags=CREATION_FLAGS, **kwargs)
+        running.add(process)
+    try:
+        yield process
+    finally:
+        with running_lock:
+            running.discard(process)
+
+
+def stop_processes():
+    """
+    Kills the running ffmpeg processes, no new ones are started afterwards
+    """
+    with running_lock:
+        stopping.set()
+        for process in running:
+            try:
+                process.kill()
+            except OSError:  # already exited
+                pass
+
+
+def write_frames(stdin, frames, errors):
+    """
+    Copies the frame files to the stdin of ffmpeg one after another, only one buffer is in memory at a time
+    """
+    try:
+        for path in frames:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, stdin, FRAME_COPY_BUFFER)
+    except BrokenPipeError:
+        pass  # ffmpeg exited, its return code tells why
+    except OSError as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def run_ffmpeg(args, on_progress=None, frames=None):
+    """
+    Run the bundled ffmpeg with the given arguments and return the finished process.
+    on_progress is called with the encoded seconds of the output, frames are image files
+    streamed to the stdin of ffmpeg
+    """
+    command = [ffmpeg_exe(), '-hide_banner', '-nostdin']
+    if on_progress is None and frames is None:
+        with ffmpeg_process(command + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            stdout, stderr = process.communicate()
+        return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+    if on_progress is not None:
+        command += ['-progress', 'pipe:1', '-nostats']
+    command += list(args)
+    errors = []
+    # a file does not block ffmpeg while stdout is read
+    with tempfile.TemporaryFile() as stderr, ffmpeg_process(
+            command, stdin=subprocess.PIPE if frames is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=stderr) as process:
+        writer = None
+        if frames is not None:
+            writer = threading.Thread(target=write_frames, args=(process.stdin, frames, errors), daemon=True)
+            writer.start()
+        for line in process.stdout:
+            key, _, value = line.decode('ascii', errors='replace').strip().partition('=')
+            if key == 'out_time_us' and value.isdigit() and on_progress:
+                on_progress(int(value) / 1000000)
+        process.wait()
+        if writer:
+            writer.join()
+        stderr.seek(0)
+        if errors:
+            raise TranscodeError(f'Can not read a frame: {errors[0]}')
+        return subprocess.CompletedProcess(command, process.returncode, b'', stderr.read())
+
+
+def parse_probe(path, size, text):
+    """
+    Parse the stream description ffmpeg prints to stderr for an input file
+    """
+    info = VideoInfo(path, size)
+    match = FORMAT_RE.search(text)
+    if match:
+        info.format_name = match.group(1).rstrip(',')
+    match = DURATION_RE.search(text)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info.duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = BITRATE_RE.search(text)
+    if match:
+        info.bitrate = int(match.group(1)) * 1000
+    elif info.duration:
+        info.bitrate = int(size * 8 / info.duration)
+    match = VIDEO_RE.search(text)
+    if match:
+        info.video_codec, info.pix_fmt = match.group(1), match.group(2)
+        info.width, info.height = int(match.group(3)), int(match.group(4))
+    match = AUDIO_RE.search(text)
+    if match:
+        info.audio_codec = match.group(1)
+    return info
+
+
+def probe(path):
+    """
+    Get size, duration, bitrate and codecs of a video without decoding it
+    """
+    size = os.path.getsize(path)
+    process = run_ffmpeg(['-i', path])  # ffmpeg exits with an error without an output, the header is enough
+    info = parse_probe(path, size, process.stderr.decode('utf-8', errors='replace'))
+    info.faststart = is_faststart(path)
+    return info
+
+
+def is_faststart(path):
+    """
+    True if the moov box of an mp4 goes before mdat, reads only the top-level box headers
+    """
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, box_type = struct.unpack('>I4s', header)
+                if box_type == b'moov':
+                    return True
+                if box_type == b'mdat':
+                    return False
+                if size == 1:  # 64-bit size follows the type
+                    size = struct.unpack('>Q', f.read(8))[0] - 8
+                elif size == 0:  # the box lasts to the end of the file
+                    return False
+                if size < 8:
+                    return False
+                f.seek(size - 8, os.SEEK_CUR)
+    except OSError:
+        return False
+
+
+def fits(info, max_size=MAX_UPLOAD_SIZE):
+    return info.size <= max_size
+
+
+def is_compatible(info):
+    """
+    Telegram plays the streams inline without re-encoding
+    """
+    return (info.video_codec in COMPATIBLE_VIDEO_CODECS and info.pix_fmt in COMPATIBLE_PIX_FMTS
+            and (info.audio_codec is None or info.audio_codec in COMPATIBLE_AUDIO_CODECS))
+
+
+SEND = 'send'
+REMUX = 'remux'
+ENCODE = 'encode'
+
+
+def plan(info, max_size=MAX_UPLOAD_SIZE):
+    """
+    Cheapest way to get a sendable file: send the source as is, copy the streams
+    into a faststart mp4, or encode. Stream copy does not make a file smaller,
+    so files over max_size are always encoded
+    """
+    if not is_compatible(info) or not fits(info, max_size):
+        return ENCODE
+    if info.faststart and os.path.splitext(info.path)[1].lower() in COMPATIBLE_EXTENSIONS:
+        return SEND
+    return REMUX
+
+
+def run_checked(args, on_progress=None, frames=None):
+    process = run_ffmpeg(args, on_progress, frames)
+    if process.returncode != 0:
+        lines = process.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        raise TranscodeError(lines[-1] if lines else 'ffmpeg failed')
+    return process
+
+
+def remux(info, out_path):
+    """
+    Copies the first video and audio streams into an mp4 with the index in front, no re-encoding
+    """
+    run_checked(['-y', '-i', info.path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+                 '-movflags', '+faststart', '-f', 'mp4', out_path])
+    return out_path
+
+
+def extract_poster(path, out_path, max_side=TELEGRAM_THUMB_SIZE, seconds=0.0):
+    """
+    One frame as a small jpeg, the first one by default: the front view of a turntable
+    """
+    run_checked(['-y', '-ss', str(seconds), '-i', path, '-frames:v', '1', '-an',
+                 '-vf', f'scale={max_side}:{max_side}:force_original_aspect_ratio=decrease',
+                 '-q:v', '4', '-f', 'image2', '-c:v', 'mjpeg', out_path])
+    return out_path
+
+
+def target_bitrate(info, max_size=MAX_UPLOAD_SIZE):
+    """
+    Video bitrate in bit/s that keeps the encoded file inside max_size
+    """
+    if not info.duration:
+        raise TranscodeError(f'Can not read the duration of {info.path}')
+    audio = AUDIO_BITRATE if info.audio_codec else 0
+    bitrate = int(max_size * 8 * BITRATE_SAFETY / info.duration) - audio
+    if info.bitrate:
+        bitrate = min(bitrate, info.bitrate)  # never inflate a file
+    return max(bitrate, MIN_VIDEO_BITRATE)
+
+
+def video_args(profile, bitrate):
+    """
+    libx264 arguments of a profile, the bitrate is the target or, for crf, the cap
+    """
+    args = ['-c:v', 'libx264', '-preset', profile['preset'], '-pix_fmt', 'yuv420p',
+            '-threads', str(profile['threads']), '-g', str(profile['keyframe_interval'])]
+    if profile.get('max_width') and profile.get('max_height'):
+        args += ['-vf', f"scale='min(iw,{profile['max_width']})':'min(ih,{profile['max_height']})'"
+                        ':force_original_aspect_ratio=decrease:force_divisible_by=2']
+    if profile['mode'] == 'crf':
+        args += ['-crf', str(profile['crf'])]
+    else:
+        args += ['-b:v', str(bitrate)]
+    args += ['-maxrate', str(bitrate), '-bufsize', str(bitrate * 2)]
+    return args
+
+
+def encode(info, out_path, bitrate, on_progress=None, profile=None):
+    """
+    Encode to H.264/AAC mp4 with the given video bitrate and encode profile,
+    on_progress is called with the encoded fraction of the video
+    """
+    profile = profile or get_profile()
+    audio_args = ['-c:a', 'aac', '-b:a', str(AUDIO_BITRATE)] if info.audio_codec else ['-an']
+    output_args = ['-movflags', '+faststart', '-f', 'mp4', out_path]
+    passes = 2 if profile['mode'] == 'two_pass' else 1
+
+    def pass_progress(done_passes):
+        if not on_progress or not info.duration:
+            return None
+        return lambda seconds: on_progress((done_passes + min(seconds / info.duration, 1.0)) / passes)
+
+    input_args = ['-y'] + info.input_args()
+
+    if passes == 1:
+        run_checked(input_args + video_args(profile, bitrate) + audio_args + output_args,
+                    pass_progress(0), info.input_frames())
+        return out_path
+    passlog = f'{out_path}.pass'  # next to the output, in the working directory of the job
+    try:
+        run_checked(input_args + video_args(profile, bitrate) +
+                    ['-pass', '1', '-passlogfile', passlog, '-an', '-f', 'null', os.devnull], pass_progress(0),
+                    info.input_frames())
+        run_checked(input_args + video_args(profile, bitrate) +
+                    ['-pass', '2', '-passlogfile', passlog] + audio_args + output_args, pass_progress(1),
+                    info.input_frames())
+    finally:
+        folder = os.path.dirname(passlog) or '.'
+        for name in os.listdir(folder):
+            if name.startswith(os.path.basename(passlog)):
+                os.remove(os.path.join(folder, name))
+    return out_path
+
+
+def encode_signature(max_size=MAX_UPLOAD_SIZE, profile_name=None):
+    """
+    Everything besides the source file that changes the encoded result
+    """
+    profile = json.dumps(get_profile(profile_name), sort_keys=True)
+    return f'libx264-{profile}-aac{AUDIO_BITRATE}-min{MIN_VIDEO_BITRATE}-k{BITRATE_SAFETY}-max{max_size}'
+
+
+def prepare(path, out_path, max_size=MAX_UPLOAD_SIZE, profile_name=None):
+    """
+    Return a path to a file that fits into max_size and plays inline: the source itself,
+    or out_path with the streams copied or encoded to the target bitrate
+    """
+    info = probe(path)
+    action = plan(info, max_size)
+    if action == SEND:
+        return path
+    if action == REMUX:
+        return remux(info, out_path)
+    return encode(info, out_path, target_bitrate(info, max_size), profile=get_profile(profile_name))
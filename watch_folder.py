@@ -0,0 +1,201 @@
+"""
+Headless sender: watches render output folders and sends every finished video through the same
+pipeline as the window. The project and the asset are taken from the path by settings.WATCH_RULES.
+Does not import Qt, runs on machines without a display.
+
+With the default rule a file is sent when its path is <project>/.../render(s)/.../<asset>.ext, the project
+folder named as in PROJECT_LIST without #. _360, _turntable and version suffixes are not part of the asset,
+e.g. //farm/projects/ardena/renders/chair/chair_360_v003.mp4 is sent as #ardena #chair.
+
+    python watch_folder.py //farm/projects/ardena/renders //farm/projects/MGS/renders --backlog
+"""
+import argparse
+import os
+import re
+import threading
+import time
+
+from environs import Env
+
+from constants import VIDEO_EXTENSIONS, WATCH_JOURNAL_FILE, WATCH_POLL_INTERVAL, WATCH_SETTLE_TIME, \
+    WATCH_PROGRESS_INTERVAL
+from pipeline import SendPipeline, make_message, print_progress
+from settings import PROJECT_LIST, WATCH_RULES, WATCH_MAX_JOBS
+
+
+def find_videos(root, extensions=VIDEO_EXTENSIONS):
+    """
+    {path: (size, mtime)} of the video files under root
+    """
+    found = {}
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if not name.lower().endswith(extensions):
+                continue
+            path = os.path.join(folder, name).replace('\\', '/')
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found[path] = (stat.st_size, stat.st_mtime)
+    return found
+
+
+def match_path(path, rules=WATCH_RULES, projects=PROJECT_LIST):
+    """
+    (project, asset) of the file by the first matching rule, None if no rule matches a known project
+    """
+    known = {project.lstrip('#').lower(): project for project in projects}
+    for rule in rules:
+        pattern = re.compile(rule, re.IGNORECASE)
+        match = pattern.search(path)
+        while match:  # the project folder may be deeper than the first folder the rule fits
+            if match.group('project').lower() in known:
+                return known[match.group('project').lower()], match.group('asset')
+            match = pattern.search(path, match.start() + 1)
+    return None
+
+
+class Debouncer:
+    """
+    Reports files once they stop changing: a render is still being written while its size or mtime moves
+    """
+    def __init__(self, settle_time=WATCH_SETTLE_TIME):
+        self.settle_time = settle_time
+        self.pending = {}  # path: ((size, mtime), time the state was first seen)
+        self.done = set()
+
+    def update(self, found, now=None):
+        """
+        Takes the current {path: (size, mtime)} of the folders, returns the paths that became stable
+        """
+        now = time.monotonic() if now is None else now
+        stable = []
+        for path, state in found.items():
+            if path in self.done or not state[0]:
+                continue
+            last_state, since = self.pending.get(path, (None, now))
+            if state != last_state:
+                self.pending[path] = (state, now)
+            elif now - since >= self.settle_time and self.readable(path):
+                del self.pending[path]
+                self.done.add(path)
+                stable.append(path)
+        for path in set(self.pending) - set(found):
+            del self.pending[path]  # removed before it was finished
+        return stable
+
+    @staticmethod
+    def readable(path):
+        """
+        A writer on Windows may hold the file without changing it for a while
+        """
+        try:
+            with open(path, 'rb'):
+                return True
+        except OSError:
+            return False
+
+
+class FolderWatcher(SendPipeline):
+    """
+    Groups the finished files of one asset into one message. Not more than max_jobs messages are
+    encoded or sent at once, so an overnight batch does not fill the pool and the disk at one time
+    """
+    def __init__(self, token, roots, max_jobs=WATCH_MAX_JOBS, poll_interval=WATCH_POLL_INTERVAL,
+                 settle_time=WATCH_SETTLE_TIME, backlog=False):
+        SendPipeline.__init__(self, token, print_progress, WATCH_JOURNAL_FILE, WATCH_PROGRESS_INTERVAL)
+        self.roots = roots
+        self.poll_interval = poll_interval
+        self.debouncer = Debouncer(settle_time)
+        self.slots = threading.BoundedSemaphore(max_jobs)
+        self.slot_jobs = set()  # jobs that hold a slot, a finished job frees only the slot it took
+        self.slot_lock = threading.Lock()
+        self.waiting = []  # jobs without a free slot
+
+        self.sweep_temp_files()
+        with self.slot_lock:  # a resumed job can not finish before its slot is noted
+            resumed = self.resume_jobs()
+            for job in resumed:
+                if self.slots.acquire(blocking=False):  # the resumed jobs over the limit just run
+                    self.slot_jobs.add(job)
+        print(f'Resumed {len(resumed)} unfinished jobs')
+        if backlog:
+            self.debouncer.done.update(self.journal.file_paths())  # sent or queued by a previous run
+        else:
+            self.debouncer.done.update(self.scan())  # only files that appear from now on are sent
+
+    def scan(self):
+        found = {}
+        for root in self.roots:
+            if os.path.isdir(root):
+                found.update(find_videos(root))
+            else:
+                print(f'Watched folder {root} is not available')
+        return found
+
+    def make_jobs(self, paths):
+        """
+        One job per project and asset of the found files
+        """
+        jobs = {}
+        for path in sorted(paths):
+            match = match_path(path)
+            if not match:
+                print(f'Skipped {path}: no rule matches it')
+                continue
+            jobs.setdefault(match, []).append(path)
+        return [{'file_path': file_path, 'project': project, 'message': make_message(project, asset)}
+                for (project, asset), file_path in jobs.items()]
+
+    def submit_waiting(self):
+        while self.waiting and self.slots.acquire(blocking=False):
+            data = self.waiting.pop(0)
+            try:
+                with self.slot_lock:
+                    job = self.submit(data)
+                    self.slot_jobs.add(job)
+                print(f'Job {job}: {data["message"].strip()!r}, {len(data["file_path"])} files')
+            except Exception as message:
+                print(f'Job {data["message"].strip()!r} was not queued: {message}')
+                self.slots.release()
+
+    def on_job_finished(self, data):
+        with self.slot_lock:
+            if data['job'] in self.slot_jobs:
+                self.slot_jobs.discard(data['job'])
+                self.slots.release()
+
+    def run(self):
+        while True:
+            self.waiting.extend(self.make_jobs(self.debouncer.update(self.scan())))
+            self.submit_waiting()
+            time.sleep(self.poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('roots', nargs='+', help='render output folders')
+    parser.add_argument('--max-jobs', type=int, default=WATCH_MAX_JOBS)
+    parser.add_argument('--poll-interval', type=float, default=WATCH_POLL_INTERVAL)
+    parser.add_argument('--settle-time', type=float, default=WATCH_SETTLE_TIME)
+    parser.add_argument('--backlog', action='store_true',
+                        help='also send the files that are already in the folders and were not sent before')
+    args = parser.parse_args()
+
+    env = Env()
+    env.read_env()
+    watcher = FolderWatcher(env('BOT_TOKEN'), [root.replace('\\', '/') for root in args.roots], args.max_jobs,
+                            args.poll_interval, args.settle_time, args.backlog)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print('Stopped, unfinished jobs are resumed on the next start')
+    finally:
+        watcher.shutdown()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
@@ -201,12 +201,19 @@ class Ui_MainWindow(object):
         self.label_5 = QtWidgets.QLabel(self.centralwidget)
         self.label_5.setObjectName("label_5")
         self.formLayout.setWidget(2, QtWidgets.QFormLayout.LabelRole, self.label_5)
+        self.tags_layout = QtWidgets.QHBoxLayout()
+        self.tags_layout.setObjectName("tags_layout")
         self.wareframe_check_box = QtWidgets.QCheckBox(self.centralwidget)
         self.wareframe_check_box.setMinimumSize(QtCore.QSize(0, 20))
         self.wareframe_check_box.setMaximumSize(QtCore.QSize(471, 16777215))
         self.wareframe_check_box.setText("")
         self.wareframe_check_box.setObjectName("wareframe_check_box")
-        self.formLayout.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.wareframe_check_box)
+        self.tags_layout.addWidget(self.wareframe_check_box)
+        self.contact_sheet_check_box = QtWidgets.QCheckBox(self.centralwidget)
+        self.contact_sheet_check_box.setMinimumSize(QtCore.QSize(0, 20))
+        self.contact_sheet_check_box.setObjectName("contact_sheet_check_box")
+        self.tags_layout.addWidget(self.contact_sheet_check_box)
+        self.formLayout.setLayout(2, QtWidgets.QFormLayout.FieldRole, self.tags_layout)
         self.verticalLayout.addLayout(self.formLayout)
         spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
         self.verticalLayout.addItem(spacerItem)
@@ -239,6 +246,7 @@ class Ui_MainWindow(object):
         self.clear_button.setText(_translate("MainWindow", "clear form"))
         self.path_button.setText(_translate("MainWindow", "add file"))
         self.label_5.setText(_translate("MainWindow", "Wireframe tag:"))
+        self.contact_sheet_check_box.setText(_translate("MainWindow", "Contact sheet"))
         self.messaje_button.setText(_translate("MainWindow", "Send message"))
 import resource_rc
 